@@ -1,12 +1,55 @@
-from valutatrade_hub.cli.interface import CLI
+import argparse
+import sys
 
 
-def main():
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        prog="project", description="ValutaTrade Hub — торговля валютами")
+    parser.add_argument("--profile", action="store_true",
+                        help="профилировать каждую команду (logs/profiles)")
+    modes = parser.add_subparsers(dest="mode")
+
+    serve = modes.add_parser("serve", help="запустить сервис на локальном сокете")
+    serve.add_argument("--socket", help="путь Unix-сокета")
+    serve.add_argument("--workers", type=int, help="потоков для команд")
+
+    connect = modes.add_parser("connect", help="тонкий клиент запущенного сервиса")
+    connect.add_argument("--socket", help="путь Unix-сокета")
+
+    run = modes.add_parser("exec", help="выполнить команды из файла или stdin")
+    run.add_argument("--script", help="файл команд, по одной в строке "
+                                      "(по умолчанию stdin)")
+    run.add_argument("--wait-refresh", action="store_true",
+                     help="перед выходом дождаться фонового обновления курсов")
+    return parser
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
     try:
-        app = CLI()
-        app.run()
+        # Импорты по режимам: тонкому клиенту не нужны ядро и парсер
+        if args.mode == "serve":
+            from valutatrade_hub.cli.server import ServiceServer
+            ServiceServer(args.socket, args.workers, args.profile).serve()
+        elif args.mode == "connect":
+            from valutatrade_hub.cli.client import run_client
+            run_client(args.socket)
+        elif args.mode == "exec":
+            from valutatrade_hub.cli.script import run_script
+            if args.script:
+                with open(args.script, 'r', encoding='utf-8') as f:
+                    errors = run_script(f, profile=args.profile,
+                                        wait_refresh=args.wait_refresh)
+            else:
+                errors = run_script(sys.stdin, profile=args.profile,
+                                    wait_refresh=args.wait_refresh)
+            return 1 if errors else 0
+        else:
+            from valutatrade_hub.cli.interface import CLI
+            app = CLI(profile=args.profile)
+            app.run()
     except KeyboardInterrupt:
         print("\nПринудительное завершение.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
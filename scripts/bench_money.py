@@ -0,0 +1,146 @@
+"""
+Бенчмарк балансов в минимальных единицах против прежнего float-кошелька.
+
+    python scripts/bench_money.py [--trades N] [--repeat R] [--max-ratio X]
+                                  [--max-balance-ratio Y]
+
+Сравнивает с FloatWallet — кошельком до перехода на минимальные единицы
+(float-баланс за свойством balance, без изменений):
+
+  trade legs  — N пар покупка+продажа, как их делают _buy_leg/_sell_leg:
+                у float-кошелька withdraw/deposit суммы и стоимости
+                amount * rate, у кошелька в единицах — deposit/withdraw
+                введенной суммы и withdraw_value/deposit_value стоимости
+                (банковское округление до минимальных единиц);
+  balance     — N чтений свойства balance (отчеты, сравнения);
+  float API   — для справки: deposit/withdraw нового кошелька со
+                стоимостью, не кратной минимальной единице (путь Decimal).
+
+Точная операция в единицах в чистом Python дороже сложения float
+(округление, проверка, целое), поэтому сделкам дан допуск --max-ratio;
+чтение баланса не должно быть медленнее (--max-balance-ratio — шум
+таймера). Код выхода 1, если допуск превышен.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from valutatrade_hub.core.exceptions import InsufficientFundsError  # noqa: E402
+from valutatrade_hub.core.models import Wallet  # noqa: E402
+
+RATE = 96192.0
+AMOUNT = 0.001
+
+
+class FloatWallet:
+    """Кошелек до перехода на минимальные единицы (как был в core.models)"""
+
+    def __init__(self, currency_code: str, balance: float = 0.0):
+        self.currency_code = currency_code.upper()
+        self._balance = float(balance)
+
+    @property
+    def balance(self) -> float:
+        return self._balance
+
+    @balance.setter
+    def balance(self, value: float):
+        if value < 0:
+            raise ValueError("Баланс не может быть отрицательным")
+        self._balance = float(value)
+
+    def deposit(self, amount: float):
+        if amount <= 0:
+            raise ValueError("Сумма пополнения должна быть положительной")
+        self.balance += amount
+
+    def withdraw(self, amount: float):
+        if amount <= 0:
+            raise ValueError("Сумма снятия должна быть положительной")
+        if amount > self._balance:
+            raise InsufficientFundsError(amount, self._balance, self.currency_code)
+        self._balance -= amount
+
+
+def float_legs(trades: int) -> float:
+    usd, btc = FloatWallet("USD", 1e9), FloatWallet("BTC")
+    started = time.perf_counter()
+    for _ in range(trades):
+        cost = AMOUNT * RATE
+        usd.withdraw(cost)
+        btc.deposit(AMOUNT)
+        revenue = AMOUNT * RATE
+        btc.withdraw(AMOUNT)
+        usd.deposit(revenue)
+    return time.perf_counter() - started
+
+
+def units_legs(trades: int) -> float:
+    usd, btc = Wallet("USD", 1e9), Wallet("BTC")
+    started = time.perf_counter()
+    for _ in range(trades):
+        usd.withdraw_value(AMOUNT * RATE)
+        btc.deposit(AMOUNT)
+        btc.withdraw(AMOUNT)
+        usd.deposit_value(AMOUNT * RATE)
+    return time.perf_counter() - started
+
+
+def float_api_legs(trades: int) -> float:
+    usd, btc = Wallet("USD", 1e9), Wallet("BTC")
+    started = time.perf_counter()
+    for _ in range(trades):
+        usd.withdraw(AMOUNT * RATE)
+        btc.deposit(AMOUNT)
+        btc.withdraw(AMOUNT)
+        usd.deposit(AMOUNT * RATE)
+    return time.perf_counter() - started
+
+
+def _read_balance(wallet, reads: int) -> float:
+    started = time.perf_counter()
+    for _ in range(reads):
+        wallet.balance
+    return time.perf_counter() - started
+
+
+def float_balance(reads: int) -> float:
+    return _read_balance(FloatWallet("USD", 1234.56), reads)
+
+
+def units_balance(reads: int) -> float:
+    return _read_balance(Wallet("USD", 1234.56), reads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--trades", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--max-ratio", type=float, default=1.6,
+                        help="допустимое отношение units / float для сделок")
+    parser.add_argument("--max-balance-ratio", type=float, default=1.1,
+                        help="то же для чтения balance")
+    args = parser.parse_args()
+
+    def best(path):
+        # Лучший из повторов: меньше всего шума планировщика
+        return min(path(args.trades) for _ in range(args.repeat))
+
+    rows = [("trade legs", best(float_legs), best(units_legs), args.max_ratio),
+            ("balance", best(float_balance), best(units_balance),
+             args.max_balance_ratio)]
+    print(f"{'':<12} {'float':>10} {'units':>10} {'ratio':>7}")
+    for name, baseline, units, _ in rows:
+        print(f"{name:<12} {baseline * 1000:8.1f}ms {units * 1000:8.1f}ms "
+              f"{units / baseline:7.2f}")
+    api = best(float_api_legs)
+    print(f"float API of the unit wallet: {api * 1000:.1f} ms "
+          f"(x{api / rows[0][1]:.2f})")
+    return 1 if any(u / b > limit for _, b, u, limit in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
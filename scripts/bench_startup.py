@@ -0,0 +1,99 @@
+"""
+Бенчмарк холодного запуска: `get-rate` в новом процессе.
+
+    python scripts/bench_startup.py [--runs N] [--budget-ms MS]
+
+Печатает медиану времени голого интерпретатора, холодного get-rate и их
+разницу (цена запуска самого приложения), а также самые дорогие импорты
+по `python -X importtime`. Код выхода 1, если цена запуска приложения
+превышает бюджет.
+
+Процессы запускаются во временном каталоге с копией data/, где курсы
+помечены свежими: бенчмарк не трогает рабочие data/ и logs/ и не уходит
+в фоновое обновление курсов на чистом checkout.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+COMMAND = "get-rate --from USD --to EUR\n"
+
+
+def _prepare_workdir(workdir):
+    """Копия data/ из репозитория, курсы — со временем обновления «сейчас»"""
+    data_dir = os.path.join(workdir, "data")
+    os.makedirs(data_dir)
+    for name in ("users.json", "portfolios.json"):
+        shutil.copy(os.path.join(ROOT, "data", name), data_dir)
+    with open(os.path.join(ROOT, "data", "rates.json"), encoding="utf-8") as f:
+        rates = json.load(f)
+    now = datetime.now(timezone.utc).isoformat()
+    for quote in rates["pairs"].values():
+        quote["updated_at"] = now
+    rates["last_refresh"] = now
+    with open(os.path.join(data_dir, "rates.json"), "w", encoding="utf-8") as f:
+        json.dump(rates, f, indent=4)
+
+
+def _run(args, workdir, stdin=""):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, *args], input=stdin, cwd=workdir,
+                            capture_output=True, text=True)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def _median_ms(args, workdir, runs, stdin=""):
+    return statistics.median(_run(args, workdir, stdin)[0] for _ in range(runs))
+
+
+def _import_times(workdir, top):
+    """(модуль, собственное мкс, накопленное мкс) самых дорогих импортов"""
+    _, result = _run(["-X", "importtime", MAIN, "exec"], workdir, COMMAND)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    app_us = sum(s for name, s, _ in rows if name.startswith("valutatrade_hub"))
+    rows.sort(key=lambda r: r[2], reverse=True)
+    return rows[:top], app_us, sum(s for _, s, _ in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=100.0,
+                        help="допустимая цена запуска сверх голого интерпретатора")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        _prepare_workdir(workdir)
+        bare = _median_ms(["-c", "pass"], workdir, args.runs)
+        cold = _median_ms([MAIN, "exec"], workdir, args.runs, COMMAND)
+        rows, app_us, total_us = _import_times(workdir, args.top)
+    overhead = cold - bare
+
+    print(f"python -c pass:          {bare:8.1f} ms")
+    print(f"cold get-rate (exec):    {cold:8.1f} ms")
+    print(f"startup overhead:        {overhead:8.1f} ms "
+          f"(budget {args.budget_ms:.0f} ms)")
+    print(f"imports total / app:     {total_us / 1000:8.1f} / {app_us / 1000:.1f} ms")
+    print("\nTop imports (cumulative):")
+    for name, self_us, cumulative_us in rows:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {self_us / 1000:6.1f} ms  {name}")
+    return 1 if overhead > args.budget_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
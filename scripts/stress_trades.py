@@ -0,0 +1,137 @@
+"""
+Стресс-тест параллельных сделок: несколько процессов покупают одну валюту
+в одном портфеле.
+
+    python scripts/stress_trades.py [--processes N] [--trades K]
+                                    [--backend json|sqlite] [--amount A]
+
+Работает во временном каталоге (своя data/, курсы копируются из data/
+проекта). Проверяет, что ни одна сделка не потеряна: прирост баланса равен
+числу подтвержденных покупок, версия портфеля выросла ровно на столько же,
+а в журнале сделок по записи на сделку. Печатает пропускную способность и
+число сделок, исчерпавших повторы. Код выхода 1, если есть потерянные или
+неисполненные сделки.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USERNAME, PASSWORD = "stress", "stress-pass"
+
+
+def _worker(trades: int, amount: float, results):
+    from valutatrade_hub.core.exceptions import ConcurrentModificationError
+    from valutatrade_hub.core.usecases import SystemCore
+
+    core = SystemCore()
+    core.login(USERNAME, PASSWORD)
+    committed = failed = 0
+    for _ in range(trades):
+        try:
+            core.buy_currency("BTC", amount)
+            committed += 1
+        except ConcurrentModificationError:
+            failed += 1
+    results.put((committed, failed))
+
+
+def _seed():
+    from valutatrade_hub.core.usecases import SystemCore
+
+    core = SystemCore()
+    core.register(USERNAME, PASSWORD)
+    core.login(USERNAME, PASSWORD)
+    record = core._current_portfolio.to_dict()
+    record["wallets"]["USD"] = {"currency_code": "USD", "balance": 1e9}
+    core.db.save_portfolio(record)
+    return core
+
+
+def _btc_units(core) -> int:
+    core._load_portfolio()
+    wallet = core._current_portfolio.get_wallet("BTC")
+    return wallet.balance_units if wallet else 0
+
+
+def _journal_entries(core) -> int:
+    with open(core.journal._path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if json.loads(line)["op"] == "BUY")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--trades", type=int, default=50,
+                        help="покупок на процесс")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--amount", type=float, default=0.00001)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="valutatrade-stress-")
+    rates = os.path.join(ROOT, "data", "rates.json")
+    os.makedirs(os.path.join(workdir, "data"))
+    if os.path.exists(rates):
+        shutil.copy(rates, os.path.join(workdir, "data"))
+    # Настройки читают data/ из текущего каталога, бэкенд — из окружения;
+    # дочерние процессы (spawn) наследуют и то, и другое
+    os.chdir(workdir)
+    os.environ["VALUTATRADE_STORAGE"] = args.backend
+
+    try:
+        from valutatrade_hub.core.money import precision_of, to_units
+
+        core = _seed()
+        units_before = _btc_units(core)
+        version_before = core._current_portfolio.version
+        entries_before = _journal_entries(core)
+
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        workers = [context.Process(target=_worker,
+                                   args=(args.trades, args.amount, results))
+                   for _ in range(args.processes)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        # Упавший процесс результата не пришлет
+        crashed = sum(1 for w in workers if w.exitcode != 0)
+        outcomes = [results.get(timeout=10)
+                    for _ in range(args.processes - crashed)]
+
+        committed = sum(c for c, _ in outcomes)
+        failed = sum(f for _, f in outcomes)
+        units = _btc_units(core) - units_before
+        expected = committed * to_units(args.amount, precision_of("BTC"))
+        versions = core._current_portfolio.version - version_before
+        entries = _journal_entries(core) - entries_before
+
+        total = args.processes * args.trades
+        print(f"backend {args.backend}: {args.processes} processes x "
+              f"{args.trades} buys in {elapsed:.2f}s "
+              f"({committed / elapsed:.0f} trades/s)")
+        print(f"committed {committed}/{total}, retries exhausted {failed}, "
+              f"crashed workers {crashed}")
+        print(f"BTC units +{units} (expected +{expected}), versions +{versions}, "
+              f"journal entries +{entries}")
+        lost = units != expected or versions != committed or entries != committed
+        if lost:
+            print("LOST UPDATES: balance, version or journal disagree")
+        return 1 if lost or failed or crashed else 0
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+BaseApiClient._get против локального http.server: повторы на 429/5xx,
+Retry-After, переиспользование keep-alive соединения и meta запроса.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from valutatrade_hub.parser_service import api_clients
+from valutatrade_hub.parser_service.api_clients import BaseApiClient
+from valutatrade_hub.parser_service.config import ParserConfig
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.client_address))
+        status, headers, delay = server.script.get(self.path, [(200, {}, 0)])[0]
+        if len(server.script.get(self.path, ())) > 1:
+            server.script[self.path].pop(0)
+        if delay:
+            # time.sleep в тесте подменен, чтобы не ждать пауз повторов
+            threading.Event().wait(delay)
+        body = json.dumps({"path": self.path, "status": status}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubClient(BaseApiClient):
+    SOURCE_NAME = "Stub"
+
+    def fetch_rates(self):
+        return []
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    httpd.script = {}
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Своя сессия на тест: пул соединений не должен жить между тестами
+    monkeypatch.setattr(api_clients, "_session", None)
+    sleeps = []
+    monkeypatch.setattr(api_clients.time, "sleep", sleeps.append)
+    config = ParserConfig(HTTP_CACHE_DIR=str(tmp_path / "http_cache"),
+                          RATE_LIMIT_DIR=str(tmp_path / "ratelimit"),
+                          MAX_RETRIES=3, RETRY_BACKOFF_BASE=0.5,
+                          RETRY_BACKOFF_MAX=8.0, REQUEST_TIMEOUT=5)
+    stub = StubClient(config)
+    stub.sleeps = sleeps
+    yield stub
+    api_clients._session.close()
+
+
+def test_429_waits_retry_after(server, client):
+    server.script["/limited"] = [(429, {"Retry-After": "2"}, 0), (200, {}, 0)]
+
+    response, meta = client._get(server.url + "/limited")
+
+    assert response.status_code == 200
+    assert meta["attempts"] == 2
+    assert client.sleeps == [2.0]
+
+
+def test_503_then_200_backs_off(server, client):
+    server.script["/flaky"] = [(503, {}, 0), (200, {}, 0)]
+
+    data, meta = client._get_json(server.url + "/flaky")
+
+    assert data == {"path": "/flaky", "status": 200}
+    assert meta["attempts"] == 2
+    assert meta["status_code"] == 200
+    assert len(client.sleeps) == 1
+    assert 0 <= client.sleeps[0] <= client.config.RETRY_BACKOFF_BASE
+
+
+def test_gives_up_after_max_retries(server, client):
+    server.script["/down"] = [(503, {}, 0)]
+
+    response, meta = client._get(server.url + "/down")
+
+    assert response.status_code == 503
+    assert meta["attempts"] == client.config.MAX_RETRIES + 1
+    assert len(client.sleeps) == client.config.MAX_RETRIES
+
+
+def test_connection_is_reused(server, client):
+    server.script["/flaky"] = [(503, {}, 0), (200, {}, 0)]
+
+    client._get(server.url + "/flaky")
+    client._get(server.url + "/one")
+    client._get(server.url + "/two")
+
+    assert len(server.requests) == 4
+    # Один и тот же клиентский порт — одно keep-alive соединение,
+    # в том числе после ответа, на который был повтор
+    assert len({address for _, address in server.requests}) == 1
+
+
+def test_meta_request_ms(server, client):
+    server.script["/slow"] = [(200, {}, 0.05)]
+
+    _, meta = client._get(server.url + "/slow")
+
+    assert meta["attempts"] == 1
+    assert 50 <= meta["request_ms"] < 5000
+
+
+def test_deadline_stops_retries(server, client):
+    server.script["/limited"] = [(429, {"Retry-After": "2"}, 0)]
+
+    response, meta = client._get(server.url + "/limited",
+                                 deadline=time.monotonic() + 1)
+
+    # Пауза Retry-After до дедлайна не успевает — повторов нет
+    assert response.status_code == 429
+    assert meta["attempts"] == 1
+    assert client.sleeps == []
+
+
+def test_deadline_caps_request_timeout(server, client):
+    server.script["/slow"] = [(200, {}, 1.0)]
+
+    started = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        client._get(server.url + "/slow", deadline=started + 0.2)
+    assert time.monotonic() - started < client.config.REQUEST_TIMEOUT
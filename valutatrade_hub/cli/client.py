@@ -0,0 +1,85 @@
+import json
+import shlex
+import socket
+
+from valutatrade_hub.infra.settings import SettingsLoader
+
+
+class ServiceClient:
+    """
+    Тонкий клиент сервиса (project serve). Не импортирует ни ядро,
+    ни парсер: запуск клиента — это только интерпретатор и сокет.
+    """
+
+    def __init__(self, socket_path: str = None):
+        settings = SettingsLoader()
+        if hasattr(socket, "AF_UNIX"):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = socket_path or settings.get("SERVICE_SOCKET")
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = ("127.0.0.1", settings.get("SERVICE_PORT"))
+        try:
+            self._sock.connect(address)
+        except OSError as e:
+            self._sock.close()
+            raise ConnectionError(
+                f"Сервис не запущен ({address}): {e}. "
+                f"Запустите 'project serve'.") from e
+        self._file = self._sock.makefile("rwb")
+
+    def request(self, command: str, args: list) -> dict:
+        payload = json.dumps({"command": command, "args": args},
+                             ensure_ascii=False)
+        self._file.write(payload.encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Сервис закрыл соединение")
+        return json.loads(line)
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+def run_client(socket_path: str = None):
+    """Интерактивный режим, как CLI.run, но команды выполняет сервис"""
+    try:
+        client = ServiceClient(socket_path)
+    except ConnectionError as e:
+        print(f"Ошибка: {e}")
+        return
+
+    print("Подключено к ValutaTrade Hub. Введите help для списка команд.")
+    user = None
+    try:
+        while True:
+            try:
+                user_input = input(f"{user or 'guest'}> ").strip()
+                if not user_input:
+                    continue
+
+                parts = shlex.split(user_input)
+                command = parts[0].lower()
+                if command in ('exit', 'quit'):
+                    print("До свидания!")
+                    break
+
+                response = client.request(command, parts[1:])
+                if not response.get("ok"):
+                    print(f"Ошибка: {response.get('error')}")
+                    continue
+                print(response["output"], end="")
+                user = response.get("user")
+
+            except (KeyboardInterrupt, EOFError):
+                print("\nВыход...")
+                break
+            except ConnectionError as e:
+                print(f"Ошибка: {e}")
+                break
+            except ValueError as e:  # shlex: незакрытая кавычка
+                print(f"Ошибка: {e}")
+    finally:
+        client.close()
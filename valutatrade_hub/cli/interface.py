@@ -1,22 +1,33 @@
-import json
-import os
+import csv
 import shlex
 
-from prettytable import PrettyTable
-
 from valutatrade_hub.core.exceptions import (
     ApiRequestError,
+    ConcurrentModificationError,
     CurrencyNotFoundError,
     InsufficientFundsError,
 )
 from valutatrade_hub.core.usecases import SystemCore
-from valutatrade_hub.parser_service.config import ParserConfig
-from valutatrade_hub.parser_service.updater import RatesUpdater
+
+# prettytable и parser_service (requests, клиенты API) импортируются в
+# командах, которым они нужны: get-rate или help не платят за их загрузку
+
+
+def _table(columns):
+    from prettytable import PrettyTable
+    t = PrettyTable(columns)
+    t.align = "l"
+    return t
+
+
+class UnknownCommandError(ValueError):
+    pass
 
 
 class CLI:
-    def __init__(self):
+    def __init__(self, profile: bool = False):
         self.core = SystemCore()
+        self.profile = profile  # --profile: каждая команда под профилировщиком
 
     def run(self):
         print("Добро пожаловать в ValutaTrade Hub! Введите help для списка команд.")
@@ -58,119 +69,13 @@ class CLI:
         return parsed
 
     def _handle_command(self, command, args):
-        kwargs = self._parse_args(args)
-
         # Блок обработки исключений доменной логики
         try:
-            if command == 'register':
-                if 'username' in kwargs and 'password' in kwargs:
-                    uid = self.core.register(kwargs['username'], kwargs['password'])
-                    print(f"Пользователь зарегистрирован (id={uid})")
-                else:
-                    print("Usage: register --username X --password Y")
-
-            elif command == 'login':
-                if 'username' in kwargs and 'password' in kwargs:
-                    name = self.core.login(kwargs['username'], kwargs['password'])
-                    print(f"Вы вошли как '{name}'")
-                else:
-                    print("Usage: login --username X --password Y")
-
-            elif command == 'show-portfolio':
-                base = kwargs.get('base', 'USD')
-                wallets, total = self.core.get_portfolio_info(base)
-
-                t = PrettyTable(['Currency', 'Info', 'Balance', f'Value ({base})'])
-                t.align = "l"
-                for w in wallets:
-                    t.add_row([w['code'], w['display'],
-                               f"{w['balance']:.4f}", f"{w['value']:.2f}"])
-                print(t)
-                print(f"ИТОГО: {total:.2f} {base}")
-
-            elif command == 'buy':
-                if 'currency' in kwargs and 'amount' in kwargs:
-                    rate, cost = self.core.buy_currency(
-                        kwargs['currency'], float(kwargs['amount']))
-                    print(f"Покупка успешна! Курс: {rate}, Списано: {cost:.2f} USD")
-                else:
-                    print("Usage: buy --currency BTC --amount 0.05")
-
-            elif command == 'sell':
-                if 'currency' in kwargs and 'amount' in kwargs:
-                    rate, rev = self.core.sell_currency(
-                        kwargs['currency'], float(kwargs['amount']))
-                    print(f"Продажа успешна! Выручено: {rev:.2f} USD")
-                else:
-                    print("Usage: sell --currency BTC --amount 0.05")
-
-            elif command == 'get-rate':
-                f, t = kwargs.get('from'), kwargs.get('to')
-                if f and t:
-                    rate, dt = self.core.get_rate(f, t)
-                    print(f"Курс {f}->{t}: {rate} (от {dt})")
-                else:
-                    print("Usage: get-rate --from USD --to BTC")
-
-            elif command == 'help':
-                print("Команды: "
-                      "register, login, buy, sell, show-portfolio, get-rate, exit")
-            elif command == 'update-rates':
-                source = kwargs.get('source')
-                print("Запуск обновления курсов (это может занять время)...")
-                updater = RatesUpdater()
-                count = updater.run_update(source_filter=source)
-                if count > 0:
-                    print(f"Обновление завершено. Обновлено пар: {count}")
-                else:
-                    print("Не удалось обновить курсы (см. логи). "
-                          "Возможно, отсутствует API Key или перебои сети.")
-
-            elif command == 'show-rates':
-                config = ParserConfig()
-                if not os.path.exists(config.RATES_FILE_PATH):
-                    print("Кэш курсов пуст. Выполните 'update-rates'.")
-                    return
-
-                with open(config.RATES_FILE_PATH, 'r') as f:
-                    data = json.load(f)
-
-                pairs = data.get("pairs", {})
-                last_refresh = data.get("last_refresh", "N/A")
-
-                # Фильтры
-                target_curr = kwargs.get('currency')
-                is_top = kwargs.get('top')
-
-                result_list = []
-                for pair, info in pairs.items():
-                    if target_curr and target_curr.upper() not in pair:
-                        continue
-                    result_list.append((pair, info['rate'], info['updated_at']))
-
-                # Сортировка
-                if is_top:
-                    # Сортируем по цене (rate) убыванию
-                    result_list.sort(key=lambda x: x[1], reverse=True)
-                    limit = int(is_top)
-                    result_list = result_list[:limit]
-                else:
-                    # По алфавиту
-                    result_list.sort(key=lambda x: x[0])
-
-                if not result_list:
-                    print(f"Курсы не найдены (фильтр: {target_curr or 'None'}).")
-                else:
-                    t = PrettyTable(['Pair', 'Rate (USD)', 'Updated At'])
-                    t.align = "l"
-                    for r in result_list:
-                        t.add_row([r[0], f"{r[1]:.5f}", r[2]])
-                    print(f"Актуальные курсы (обновлено: {last_refresh}):")
-                    print(t)
-            else:
-                print(f"Неизвестная команда: {command}")
+            self._run(command, args)
 
         # Обработка ожидаемых бизнес-ошибок
+        except UnknownCommandError:
+            print(f"Неизвестная команда: {command}")
         except InsufficientFundsError as e:
             print(f"Ошибка операции: {e}")
         except CurrencyNotFoundError as e:
@@ -178,7 +83,240 @@ class CLI:
                   f"Используйте общепринятые коды (USD, BTC, ETH).")
         except ApiRequestError as e:
             print(f"Ошибка сети: {e}")
+        except ConcurrentModificationError as e:
+            print(f"Конфликт: {e}")
         except ValueError as e:
             print(f"Ошибка данных: {e}")
         except PermissionError as e:
-            print(f"Доступ запрещен: {e}")
\ No newline at end of file
+            print(f"Доступ запрещен: {e}")
+
+    def _run(self, command, args):
+        """
+        Выполняет команду со списком аргументов; `profile <команда ...>` или
+        флаг --profile выполняют ее под профилировщиком и печатают сводку.
+        """
+        profiled = self.profile
+        if command == 'profile':
+            if not args:
+                print("Usage: profile <command> [--key value ...]")
+                return
+            command, args, profiled = args[0].lower(), args[1:], True
+        if not profiled:
+            self._dispatch(command, self._parse_args(args))
+            return
+
+        from valutatrade_hub.profiling import CommandProfiler
+        profiler = CommandProfiler(command)
+        try:
+            profiler.run(self._dispatch, command, self._parse_args(args))
+        finally:
+            print(profiler.report())
+
+    def _dispatch(self, command, kwargs):
+        """Выполняет команду; доменные ошибки пробрасываются вызывающему"""
+        if command == 'register':
+            if 'username' in kwargs and 'password' in kwargs:
+                uid = self.core.register(kwargs['username'], kwargs['password'])
+                print(f"Пользователь зарегистрирован (id={uid})")
+            else:
+                print("Usage: register --username X --password Y")
+
+        elif command == 'login':
+            if 'username' in kwargs and 'password' in kwargs:
+                name = self.core.login(kwargs['username'], kwargs['password'])
+                print(f"Вы вошли как '{name}'")
+            else:
+                print("Usage: login --username X --password Y")
+
+        elif command == 'show-portfolio':
+            base = kwargs.get('base', 'USD')
+            wallets, total = self.core.get_portfolio_info(base)
+
+            t = _table(['Currency', 'Info', 'Balance', f'Value ({base})'])
+            for w in wallets:
+                t.add_row([w['code'], w['display'],
+                           f"{w['balance']:.4f}", f"{w['value']:.2f}"])
+            print(t)
+            print(f"ИТОГО: {total:.2f} {base}")
+
+        elif command == 'buy':
+            if 'currency' in kwargs and 'amount' in kwargs:
+                rate, cost = self.core.buy_currency(
+                    kwargs['currency'], float(kwargs['amount']))
+                print(f"Покупка успешна! Курс: {rate}, Списано: {cost:.2f} USD")
+            else:
+                print("Usage: buy --currency BTC --amount 0.05")
+
+        elif command == 'sell':
+            if 'currency' in kwargs and 'amount' in kwargs:
+                rate, rev = self.core.sell_currency(
+                    kwargs['currency'], float(kwargs['amount']))
+                print(f"Продажа успешна! Выручено: {rev:.2f} USD")
+            else:
+                print("Usage: sell --currency BTC --amount 0.05")
+
+        elif command == 'get-rate':
+            f, t = kwargs.get('from'), kwargs.get('to')
+            if f and t:
+                rate, dt, is_fresh = self.core.get_rate(f, t)
+                print(f"Курс {f}->{t}: {rate} (от {dt})")
+                if not is_fresh:
+                    print("Внимание: курс устарел, обновление выполняется в фоне.")
+            else:
+                print("Usage: get-rate --from USD --to BTC")
+
+        elif command == 'help':
+            print("Команды: "
+                  "register, login, buy, sell, trade-batch, show-portfolio, "
+                  "get-rate, update-rates, show-rates, show-history, "
+                  "revalue-all, migrate-storage, convert-history, stats, "
+                  "profile, exit")
+        elif command == 'update-rates':
+            source = kwargs.get('source')
+            print("Запуск обновления курсов (это может занять время)...")
+            from valutatrade_hub.parser_service.updater import RatesUpdater
+            updater = RatesUpdater()
+            count = updater.run_update(source_filter=source)
+            if count > 0:
+                print(f"Обновление завершено. Обновлено пар: {count}")
+            else:
+                print("Не удалось обновить курсы (см. логи). "
+                      "Возможно, отсутствует API Key или перебои сети.")
+
+        elif command == 'show-rates':
+            data = self.core.rates_cache.get_data()
+            if not data:
+                print("Кэш курсов пуст. Выполните 'update-rates'.")
+                return
+
+            pairs = data.get("pairs", {})
+            last_refresh = data.get("last_refresh", "N/A")
+
+            # Фильтры
+            target_curr = kwargs.get('currency')
+            is_top = kwargs.get('top')
+
+            result_list = []
+            for pair, info in pairs.items():
+                if target_curr and target_curr.upper() not in pair:
+                    continue
+                result_list.append((pair, info['rate'], info['updated_at']))
+
+            # Сортировка
+            if is_top:
+                # Сортируем по цене (rate) убыванию
+                result_list.sort(key=lambda x: x[1], reverse=True)
+                limit = int(is_top)
+                result_list = result_list[:limit]
+            else:
+                # По алфавиту
+                result_list.sort(key=lambda x: x[0])
+
+            if not result_list:
+                print(f"Курсы не найдены (фильтр: {target_curr or 'None'}).")
+            else:
+                t = _table(['Pair', 'Rate (USD)', 'Updated At'])
+                for r in result_list:
+                    t.add_row([r[0], f"{r[1]:.5f}", r[2]])
+                print(f"Актуальные курсы (обновлено: {last_refresh}):")
+                print(t)
+
+        elif command == 'migrate-storage':
+            users, portfolios = self.core.db.migrate_json_to_sqlite()
+            print(f"Импортировано в SQLite: пользователей {users}, "
+                  f"портфелей {portfolios}. "
+                  "Включите бэкенд: VALUTATRADE_STORAGE=sqlite")
+
+        elif command == 'convert-history':
+            from valutatrade_hub.parser_service.config import ParserConfig
+            from valutatrade_hub.parser_service.storage import RatesStorage
+            count = RatesStorage(ParserConfig()).convert_legacy_history()
+            print(f"Перенесено записей истории в JSONL-сегменты: {count}")
+
+        elif command == 'show-history':
+            pair = kwargs.get('pair')
+            if not pair:
+                print("Usage: show-history --pair BTC_USD [--from ISO] "
+                      "[--to ISO] [--interval 1m|1h|1d]")
+                return
+            from valutatrade_hub.parser_service.history import RatesHistory
+            history = RatesHistory()
+            interval = kwargs.get('interval')
+            found = False
+            if interval:
+                # Бары печатаются по мере расчета, без накопления в памяти
+                for bar in history.bars(pair.upper(), interval,
+                                        kwargs.get('from'), kwargs.get('to')):
+                    if not found:
+                        print("Open Time | Open | High | Low | Close | "
+                              "VWAP | Ticks")
+                        found = True
+                    print(f"{bar['open_time']} | {bar['open']:.5f} | "
+                          f"{bar['high']:.5f} | {bar['low']:.5f} | "
+                          f"{bar['close']:.5f} | {bar['vwap']:.5f} | "
+                          f"{bar['ticks']}")
+            else:
+                for ts, rate in history.ticks(pair.upper(), kwargs.get('from'),
+                                              kwargs.get('to')):
+                    found = True
+                    print(f"{ts} | {rate:.5f}")
+            if not found:
+                print(f"История для {pair.upper()} не найдена.")
+
+        elif command == 'revalue-all':
+            bases = kwargs.get('bases', '')
+            bases = [b.strip() for b in bases.split(',') if b.strip()]
+            count, path = self.core.revalue_all(bases, kwargs.get('output'))
+            print(f"Переоценено портфелей: {count}. Отчет: {path}")
+
+        elif command == 'trade-batch':
+            path = kwargs.get('file')
+            if not path:
+                print("Usage: trade-batch --file orders.csv "
+                      "(колонки: side,currency,amount)")
+                return
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                orders = list(csv.DictReader(f))
+            committed, report = self.core.execute_batch(orders)
+
+            t = _table(['#', 'Side', 'Currency', 'Amount', 'Rate',
+                        'Value (USD)', 'Status'])
+            for leg in report:
+                value = f"{leg['value']:.2f}" if 'value' in leg else ""
+                t.add_row([leg['leg'], leg['side'], leg['currency'],
+                           leg['amount'], leg.get('rate', ""), value,
+                           leg.get('error', leg['status'])])
+            print(t)
+            if committed:
+                print(f"Пакет исполнен, операций: {len(report)}.")
+            else:
+                print("Пакет отклонен, портфель не изменен.")
+
+        elif command == 'stats':
+            from valutatrade_hub.metrics import MetricsRegistry
+            registry = MetricsRegistry()
+            if not registry.enabled:
+                print("Метрики отключены (METRICS_ENABLED=False).")
+                return
+            rows = registry.summary()
+            if not rows:
+                print("Метрик пока нет: выполните хотя бы одну операцию.")
+            else:
+                t = _table(['Operation', 'Calls', 'Errors', 'Avg ms', 'p50 ms',
+                            'p95 ms', 'p99 ms', 'Max ms'])
+                for row in rows:
+                    name = row['name']
+                    if row['labels']:
+                        name += " " + ",".join(
+                            f"{k}={v}" for k, v in row['labels'].items())
+                    t.add_row([name, row['count'], row['errors'],
+                               f"{row['avg_ms']:.3f}", f"{row['p50_ms']:.3f}",
+                               f"{row['p95_ms']:.3f}", f"{row['p99_ms']:.3f}",
+                               f"{row['max_ms']:.3f}"])
+                print(t)
+            cache = self.core.rates_cache.stats()
+            print("Кэш курсов: " + ", ".join(f"{k}={v}" for k, v in cache.items()))
+            path = registry.export(kwargs.get('export'))
+            print(f"Метрики (Prometheus): {path}")
+        else:
+            raise UnknownCommandError(command)
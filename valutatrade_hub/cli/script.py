@@ -0,0 +1,65 @@
+import io
+import json
+import shlex
+import sys
+import time
+from contextlib import redirect_stdout
+from typing import Iterable, TextIO
+
+from valutatrade_hub.parser_service.config import ParserConfig
+from valutatrade_hub.parser_service.refresher import BackgroundRefresher
+
+from .interface import CLI
+
+
+def run_script(lines: Iterable[str], out: TextIO = None,
+               profile: bool = False, wait_refresh: bool = False) -> int:
+    """
+    Выполняет команды построчно в одном процессе и одной сессии CLI
+    (SystemCore, кэши и индексы остаются теплыми). На каждую команду —
+    JSON-строка результата, в конце — сводка с пропускной способностью.
+    Пустые строки и строки с '#' пропускаются. Возвращает число ошибок.
+    wait_refresh — перед выходом дождаться фонового обновления курсов.
+    """
+    out = out or sys.stdout
+    session = CLI(profile=profile)
+    executed = errors = 0
+    started = time.perf_counter()
+
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        result = {"line": number}
+        buffer = io.StringIO()
+        begin = time.perf_counter()
+        try:
+            parts = shlex.split(line)
+            result["command"] = command = parts[0].lower()
+            if command in ('exit', 'quit'):
+                break
+            with redirect_stdout(buffer):
+                session._run(command, parts[1:])
+            result["ok"] = True
+        except Exception as e:
+            result.update(ok=False, error=type(e).__name__, message=str(e))
+            errors += 1
+        result["output"] = buffer.getvalue().rstrip("\n")
+        result["ms"] = round((time.perf_counter() - begin) * 1000, 3)
+        executed += 1
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    elapsed = time.perf_counter() - started
+    if wait_refresh:
+        # get-rate на устаревшем курсе запускает обновление в daemon-потоке;
+        # по умолчанию выход его обрывает (stale-while-revalidate: ответ
+        # уже отдан), с --wait-refresh ждем не дольше UPDATE_DEADLINE
+        BackgroundRefresher().wait(ParserConfig.UPDATE_DEADLINE)
+    out.write(json.dumps({"summary": {
+        "commands": executed,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "commands_per_second": round(executed / elapsed, 1) if elapsed else None
+    }}) + "\n")
+    out.flush()
+    return errors
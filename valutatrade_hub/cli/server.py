@@ -0,0 +1,166 @@
+import asyncio
+import functools
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from valutatrade_hub.infra.settings import SettingsLoader
+
+from .interface import CLI
+
+
+class _ThreadStdout(io.TextIOBase):
+    """
+    Подмена sys.stdout на время работы сервиса: в потоке, выполняющем
+    запрос, print() пишет в буфер этого запроса, в остальных — в консоль.
+    """
+
+    def __init__(self, target):
+        self._target = target
+        self._local = threading.local()
+
+    @contextmanager
+    def capture(self):
+        buffer = io.StringIO()
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = None
+
+    def write(self, text):
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer or self._target).write(text)
+
+    def flush(self):
+        self._target.flush()
+
+
+class ServiceServer:
+    """
+    Долгоживущий сервис: SystemCore, кэши курсов и индексы хранилища
+    остаются «теплыми» между командами.
+
+    Протокол — JSON-строки через Unix-сокет (на платформах без AF_UNIX —
+    TCP 127.0.0.1:SERVICE_PORT):
+        -> {"command": "buy", "args": ["--currency", "BTC", "--amount", "1"]}
+        <- {"ok": true, "output": "...", "user": "alice"}
+    Каждое соединение — отдельная сессия CLI (свой login). Команды
+    выполняются в пуле потоков, цикл asyncio только читает и пишет сокеты.
+    """
+
+    def __init__(self, socket_path: str = None, workers: int = None,
+                 profile: bool = False):
+        settings = SettingsLoader()
+        self.socket_path = socket_path or settings.get("SERVICE_SOCKET")
+        self.port = settings.get("SERVICE_PORT")
+        self.workers = workers or settings.get("SERVICE_WORKERS")
+        self._pool = ThreadPoolExecutor(self.workers,
+                                        thread_name_prefix="valutatrade-worker")
+        self.profile = profile
+        self._stdout = None
+        self.requests = 0
+
+    def _warm_up(self):
+        session = CLI()
+        session.core._get_matrix()     # rates.json + матрица кросс-курсов
+        session.core.db.next_user_id()  # индекс пользователей
+
+    def _execute(self, session: CLI, command: str, args: list) -> str:
+        with self._stdout.capture() as buffer:
+            try:
+                session._handle_command(command, args)
+            except Exception as e:
+                # Так же, как интерактивный CLI.run
+                print(f"Ошибка: {e}")
+        return buffer.getvalue()
+
+    async def _handle_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        session = None
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    command = str(request["command"]).lower()
+                    args = [str(a) for a in request.get("args", [])]
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    response = {"ok": False, "error": f"Неверный запрос: {e}"}
+                else:
+                    if session is None:
+                        session = await loop.run_in_executor(
+                            self._pool, functools.partial(CLI, self.profile))
+                    output = await loop.run_in_executor(
+                        self._pool, self._execute, session, command, args)
+                    self.requests += 1
+                    user = session.core.current_user
+                    response = {"ok": True, "output": output,
+                                "user": user.username if user else None}
+                writer.write(json.dumps(response, ensure_ascii=False).encode()
+                             + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _prepare_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)  # сокет от упавшего сервиса
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"Сервис уже запущен ({self.socket_path})")
+
+    async def _serve(self):
+        if hasattr(socket, "AF_UNIX"):
+            server = await asyncio.start_unix_server(self._handle_client,
+                                                     path=self.socket_path)
+            address = self.socket_path
+        else:
+            server = await asyncio.start_server(self._handle_client,
+                                                "127.0.0.1", self.port)
+            address = f"127.0.0.1:{self.port}"
+        print(f"ValutaTrade Hub: сервис слушает {address} "
+              f"(потоков: {self.workers}). Ctrl+C — остановка.")
+        if hasattr(signal, "SIGTERM") and os.name != "nt":
+            # Остановка демона по kill так же, как по Ctrl+C
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                                                          server.close)
+        async with server:
+            try:
+                await server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def serve(self):
+        if hasattr(socket, "AF_UNIX"):
+            try:
+                self._prepare_socket()
+            except RuntimeError as e:
+                print(f"Ошибка: {e}")
+                return
+        self._warm_up()
+        original = sys.stdout
+        sys.stdout = self._stdout = _ThreadStdout(original)
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sys.stdout = original
+            self._pool.shutdown(wait=True)
+            if hasattr(socket, "AF_UNIX") and os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        print(f"\nСервис остановлен (обработано запросов: {self.requests}).")
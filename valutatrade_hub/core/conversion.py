@@ -0,0 +1,167 @@
+from array import array
+from typing import Dict, Optional, Tuple
+
+_NO_PATH = 127  # hops: пути нет
+
+
+class ConversionMatrix:
+    """
+    Плотная матрица курсов currency x currency, строится из снимка пар
+    один раз на обновление. Недостающие курсы получаются инверсией и
+    триангуляцией по кратчайшему пути (при равенстве — через pivot, USD).
+    Поиск курса — индексация массива.
+    """
+
+    def __init__(self, pivot: str = "USD"):
+        self.pivot = pivot
+        self.codes = []
+        self._index: Dict[str, int] = {}
+        self._n = 0
+        self._rates = array('d')
+        self._via = array('i')   # промежуточная валюта пути, -1 — прямой курс
+        self._hops = array('b')
+        self._order = []
+        self._meta = []          # (updated_at, source) самого старого звена
+        self._edges = {}         # (i, j) -> (rate, updated_at, source)
+        self._snapshot = None
+        self.full_builds = 0
+        self.incremental_updates = 0
+
+    @staticmethod
+    def _direct_edges(pairs: dict) -> Dict[Tuple[str, str], tuple]:
+        inverse, direct = {}, {}
+        for pair, info in pairs.items():
+            try:
+                frm, to = pair.upper().split("_")
+                rate = float(info['rate'])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if rate <= 0:
+                continue
+            meta = (info.get('updated_at', ""), info.get('source'))
+            direct[(frm, to)] = (rate,) + meta
+            inverse[(to, frm)] = (1 / rate,) + meta
+        # Прямые котировки важнее вычисленных обратных
+        inverse.update(direct)
+        return inverse
+
+    def update(self, pairs: dict):
+        """Перестраивает матрицу; если набор пар не изменился — частично"""
+        if pairs is self._snapshot:
+            return
+        self._snapshot = pairs
+        named = self._direct_edges(pairs)
+        codes = sorted({c for edge in named for c in edge} | {self.pivot})
+        if codes == self.codes:
+            index = self._index
+            edges = {(index[a], index[b]): v for (a, b), v in named.items()}
+            if edges.keys() == self._edges.keys():
+                self._update_rates(edges)
+                return
+        self._build(codes, named)
+
+    def _build(self, codes, named):
+        n = len(codes)
+        self.codes = codes
+        self._index = {c: i for i, c in enumerate(codes)}
+        self._n = n
+        self._edges = {(self._index[a], self._index[b]): v
+                       for (a, b), v in named.items()}
+
+        hops = array('b', [_NO_PATH]) * (n * n)
+        via = array('i', [-1]) * (n * n)
+        for i in range(n):
+            hops[i * n + i] = 0
+        for i, j in self._edges:
+            hops[i * n + j] = 1
+
+        # Floyd–Warshall по числу звеньев; pivot рассматривается первым,
+        # поэтому при равной длине путь идет через него
+        pivot = self._index[self.pivot]
+        order = [pivot] + [k for k in range(n) if k != pivot]
+        for k in order:
+            for i in range(n):
+                ik = hops[i * n + k]
+                if ik == _NO_PATH:
+                    continue
+                for j in range(n):
+                    kj = hops[k * n + j]
+                    if kj != _NO_PATH and ik + kj < hops[i * n + j]:
+                        hops[i * n + j] = ik + kj
+                        via[i * n + j] = k
+
+        self._hops, self._via = hops, via
+        # Порядок пересчета: по возрастанию длины пути
+        self._order = sorted((h, c) for c, h in enumerate(hops)
+                             if 0 < h < _NO_PATH)
+        self._rates = array('d', [0.0]) * (n * n)
+        self._meta = [None] * (n * n)
+        self._recompute(dirty_edges=None)
+        self.full_builds += 1
+
+    def _update_rates(self, edges):
+        changed = {e for e, v in edges.items() if self._edges[e] != v}
+        self._edges = edges
+        if changed:
+            self._recompute(dirty_edges=changed)
+        self.incremental_updates += 1
+
+    def _recompute(self, dirty_edges: Optional[set]):
+        """
+        Пересчитывает ячейки по возрастанию длины пути; при частичном
+        обновлении — только зависящие от измененных звеньев.
+        """
+        n = self._n
+        via, rates, meta = self._via, self._rates, self._meta
+        dirty = bytearray(n * n)
+        for i in range(n):
+            rates[i * n + i] = 1.0
+        for h, c in self._order:
+            i, j = divmod(c, n)
+            if h == 1:
+                if dirty_edges is not None and (i, j) not in dirty_edges:
+                    continue
+                rate, updated_at, source = self._edges[(i, j)]
+                rates[c] = rate
+                meta[c] = (updated_at, source)
+            else:
+                k = via[c]
+                left, right = i * n + k, k * n + j
+                if dirty_edges is not None and not (dirty[left] or dirty[right]):
+                    continue
+                rates[c] = rates[left] * rates[right]
+                meta[c] = min((m for m in (meta[left], meta[right]) if m),
+                              key=lambda m: m[0])
+            dirty[c] = 1
+
+    def lookup(self, from_code: str, to_code: str) -> Optional[tuple]:
+        """(rate, updated_at, source) или None, если курс не вывести"""
+        i = self._index.get(from_code.upper())
+        j = self._index.get(to_code.upper())
+        if i is None or j is None:
+            return None
+        c = i * self._n + j
+        if i == j:
+            return 1.0, None, None
+        if self._hops[c] == _NO_PATH:
+            return None
+        updated_at, source = self._meta[c]
+        return self._rates[c], updated_at, source
+
+    def rate(self, from_code: str, to_code: str) -> float:
+        """Курс или 0.0, если его нет (горячий путь сделки: без lookup)"""
+        from_code, to_code = from_code.upper(), to_code.upper()
+        i = self._index.get(from_code)
+        j = self._index.get(to_code)
+        if i is None or j is None:
+            return 1.0 if from_code == to_code else 0.0
+        # Диагональ — 1.0, ячейки без пути остаются 0.0
+        return self._rates[i * self._n + j]
+
+    def column(self, to_code: str) -> Optional[array]:
+        """Курсы всех валют (в порядке self.codes) к to_code"""
+        j = self._index.get(to_code.upper())
+        if j is None:
+            return None
+        n = self._n
+        return array('d', (self._rates[i * n + j] for i in range(n)))
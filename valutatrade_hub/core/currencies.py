@@ -5,9 +5,11 @@ from .exceptions import CurrencyNotFoundError
 
 
 class Currency(ABC):
-    def __init__(self, code: str, name: str):
+    def __init__(self, code: str, name: str, precision: int):
         self.code = code.upper()
         self.name = name
+        # Знаков после запятой: баланс хранится в целых минимальных единицах
+        self.precision = precision
 
     @abstractmethod
     def get_display_info(self) -> str:
@@ -15,16 +17,18 @@ class Currency(ABC):
         pass
 
 class FiatCurrency(Currency):
-    def __init__(self, code: str, name: str, issuing_country: str):
-        super().__init__(code, name)
+    def __init__(self, code: str, name: str, issuing_country: str,
+                 precision: int = 2):
+        super().__init__(code, name, precision)
         self.issuing_country = issuing_country
 
     def get_display_info(self) -> str:
         return f"[FIAT] {self.code} — {self.name} (Issuing: {self.issuing_country})"
 
 class CryptoCurrency(Currency):
-    def __init__(self, code: str, name: str, algorithm: str, market_cap: str = "N/A"):
-        super().__init__(code, name)
+    def __init__(self, code: str, name: str, algorithm: str, market_cap: str = "N/A",
+                 precision: int = 8):
+        super().__init__(code, name, precision)
         self.algorithm = algorithm
         self.market_cap = market_cap
 
@@ -40,8 +44,8 @@ _SUPPORTED_CURRENCIES: Dict[str, Currency] = {
     "RUB": FiatCurrency("RUB", "Russian Ruble", "Russia"),
     # CRYPTO
     "BTC": CryptoCurrency("BTC", "Bitcoin", "SHA-256", "1.2T"),
-    "ETH": CryptoCurrency("ETH", "Ethereum", "Ethash", "400B"),
-    "USDT": CryptoCurrency("USDT", "Tether", "ERC-20", "100B"),
+    "ETH": CryptoCurrency("ETH", "Ethereum", "Ethash", "400B", precision=18),
+    "USDT": CryptoCurrency("USDT", "Tether", "ERC-20", "100B", precision=6),
 }
 
 def get_currency(code: str) -> Currency:
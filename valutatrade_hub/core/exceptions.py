@@ -13,4 +13,16 @@ class CurrencyNotFoundError(Exception):
 class ApiRequestError(Exception):
     def __init__(self, reason):
         self.message = f"Ошибка при обращении к внешнему API: {reason}"
+        super().__init__(self.message)
+
+class RateLimitExceededError(ApiRequestError):
+    def __init__(self, source, retry_in):
+        self.retry_in = retry_in
+        super().__init__(f"превышен лимит запросов к {source}, "
+                         f"повторите через {retry_in:.1f} с")
+
+class ConcurrentModificationError(Exception):
+    def __init__(self, user_id):
+        self.message = (f"Портфель пользователя {user_id} изменен "
+                        f"другим процессом, повторите операцию")
         super().__init__(self.message)
\ No newline at end of file
@@ -1,8 +1,20 @@
-import hashlib
 from datetime import datetime
-from typing import Dict
+from decimal import Decimal
+from math import floor
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
 
 from .exceptions import InsufficientFundsError
+from .money import (
+    EXACT_FLOAT_INT,
+    Amount,
+    from_units,
+    precision_of,
+    scale_of,
+    to_units,
+    units_to_float,
+)
+from .utils import hash_password
 
 
 class User:
@@ -30,13 +42,13 @@ class User:
 
     def verify_password(self, password: str) -> bool:
         # Простейшая проверка хеша: hash(pass + salt)
-        check_hash = hashlib.sha256((password + self._salt).encode()).hexdigest()
+        check_hash = hash_password(password, self._salt)
         return check_hash == self._hashed_password
 
     def change_password(self, new_password: str):
         if len(new_password) < 4:
             raise ValueError("Пароль должен быть не короче 4 символов")
-        new_hash = hashlib.sha256((new_password + self._salt).encode()).hexdigest()
+        new_hash = hash_password(new_password, self._salt)
         self._hashed_password = new_hash
 
     def to_dict(self) -> dict:
@@ -51,32 +63,164 @@ class User:
 
 
 class Wallet:
-    def __init__(self, currency_code: str, balance: float = 0.0):
+    """
+    Кошелек — ссылка на ячейку массива балансов. Баланс хранится целым
+    числом минимальных единиц валюты (precision из реестра валют), поэтому
+    deposit/withdraw не накапливают ошибку округления. Отдельный кошелек
+    хранит свой список из одного элемента, кошелек портфеля — ячейку
+    списка Portfolio.
+
+    Рядом с единицами кошелек держит тот же баланс во float (_value) и
+    обновляет его при каждом изменении: чтение balance — горячий путь
+    отчетов и сравнений, и оно не должно стоить деления. Ячейку портфеля
+    меняет только ее кошелек (Portfolio кэширует по одному на валюту),
+    поэтому копия не расходится с единицами.
+    """
+    __slots__ = ("currency_code", "precision", "_balances", "_slot", "_scale",
+                 "_fscale", "_value")
+
+    def __init__(self, currency_code: str, balance: Amount = 0.0):
         self.currency_code = currency_code.upper()
-        self._balance = float(balance)
+        self.precision = precision_of(self.currency_code)
+        self._scale = scale_of(self.precision)
+        self._fscale = float(self._scale)
+        self._balances = [0]
+        self._slot = 0
+        self.balance = balance
+
+    @classmethod
+    def _bind(cls, currency_code: str, balances: list, slot: int,
+              precision: int) -> "Wallet":
+        wallet = cls.__new__(cls)
+        wallet.currency_code = currency_code
+        wallet.precision = precision
+        wallet._scale = scale_of(precision)
+        wallet._fscale = float(wallet._scale)
+        wallet._balances = balances
+        wallet._slot = slot
+        wallet._value = balances[slot] / wallet._scale
+        return wallet
 
     @property
     def balance(self) -> float:
-        return self._balance
+        return self._value
 
     @balance.setter
-    def balance(self, value: float):
-        if value < 0:
+    def balance(self, value: Amount):
+        units = to_units(value, self.precision)
+        if units < 0:
             raise ValueError("Баланс не может быть отрицательным")
-        self._balance = float(value)
+        self._balances[self._slot] = units
+        self._value = units / self._scale
+
+    @property
+    def balance_units(self) -> int:
+        return self._balances[self._slot]
+
+    @property
+    def balance_decimal(self) -> Decimal:
+        return from_units(self._balances[self._slot], self.precision)
+
+    def _invalid_amount(self, amount: Amount, message: str) -> ValueError:
+        if Decimal(str(amount)) > 0:
+            return ValueError(f"Сумма меньше минимальной единицы "
+                              f"{self.currency_code} (1e-{self.precision})")
+        return ValueError(message)
+
+    def deposit(self, amount: Amount):
+        # Быстрый путь to_units для float — прямо здесь: вызов функции на
+        # каждой операции кошелька стоит столько же, сколько сама операция
+        if type(amount) is float:
+            scaled = amount * self._fscale
+            units = floor(scaled + 0.5)
+            if not (0 < units < EXACT_FLOAT_INT
+                    and -1e-7 <= scaled - units <= 1e-7):
+                units = self._checked_units(amount, "пополнения")
+        else:
+            units = self._checked_units(amount, "пополнения")
+        units += self._balances[self._slot]
+        self._balances[self._slot] = units
+        self._value = units / self._scale
+
+    def withdraw(self, amount: Amount):
+        if type(amount) is float:
+            scaled = amount * self._fscale
+            units = floor(scaled + 0.5)
+            if not (0 < units < EXACT_FLOAT_INT
+                    and -1e-7 <= scaled - units <= 1e-7):
+                units = self._checked_units(amount, "снятия")
+        else:
+            units = self._checked_units(amount, "снятия")
+        available = self._balances[self._slot]
+        if units > available:
+            # Используем кастомное исключение из Этапа 2
+            raise InsufficientFundsError(amount, self._value, self.currency_code)
+        units = available - units
+        self._balances[self._slot] = units
+        self._value = units / self._scale
+
+    def _checked_units(self, amount: Amount, operation: str) -> int:
+        """Общий путь: to_units и проверка, что сумма положительна"""
+        units = to_units(amount, self.precision)
+        if units <= 0:
+            raise self._invalid_amount(
+                amount, f"Сумма {operation} должна быть положительной")
+        return units
 
-    def deposit(self, amount: float):
-        if amount <= 0:
+    def deposit_value(self, value: float) -> float:
+        """
+        Зачисляет вычисленную сумму (amount * rate), округляя ее до
+        минимальных единиц банковски, без Decimal (как round_units).
+        Возвращает зачисленное — уже округленное — значение.
+        """
+        scaled = value * self._fscale
+        units = floor(scaled + 0.5)
+        if units - scaled == 0.5 and units & 1:
+            units -= 1
+        if units <= 0:
+            raise self._invalid_amount(
+                value, "Сумма пополнения должна быть положительной")
+        balance = self._balances[self._slot] + units
+        self._balances[self._slot] = balance
+        self._value = balance / self._scale
+        return units / self._scale
+
+    def withdraw_value(self, value: float) -> float:
+        """Списывает вычисленную сумму; возвращает списанное значение"""
+        scaled = value * self._fscale
+        units = floor(scaled + 0.5)
+        if units - scaled == 0.5 and units & 1:
+            units -= 1
+        if units <= 0:
+            raise self._invalid_amount(value,
+                                       "Сумма снятия должна быть положительной")
+        available = self._balances[self._slot]
+        if units > available:
+            raise InsufficientFundsError(units / self._scale, self._value,
+                                         self.currency_code)
+        balance = available - units
+        self._balances[self._slot] = balance
+        self._value = balance / self._scale
+        return units / self._scale
+
+    def deposit_units(self, units: int):
+        """Горячий путь: сумма уже в минимальных единицах"""
+        if units <= 0:
             raise ValueError("Сумма пополнения должна быть положительной")
-        self.balance += amount
+        units += self._balances[self._slot]
+        self._balances[self._slot] = units
+        self._value = units / self._scale
 
-    def withdraw(self, amount: float):
-        if amount <= 0:
+    def withdraw_units(self, units: int):
+        if units <= 0:
             raise ValueError("Сумма снятия должна быть положительной")
-        if amount > self._balance:
-            # Используем кастомное исключение из Этапа 2
-            raise InsufficientFundsError(amount, self._balance, self.currency_code)
-        self._balance -= amount
+        available = self._balances[self._slot]
+        if units > available:
+            raise InsufficientFundsError(units / self._scale, self._value,
+                                         self.currency_code)
+        units = available - units
+        self._balances[self._slot] = units
+        self._value = units / self._scale
 
     def get_balance_info(self) -> str:
         return f"{self.currency_code}: {self.balance:.4f}"
@@ -84,54 +228,122 @@ class Wallet:
     def to_dict(self) -> dict:
         return {
             "currency_code": self.currency_code,
-            "balance": self.balance
+            "balance": self.balance,
+            "balance_units": self.balance_units
         }
 
 
 class Portfolio:
-    def __init__(self, user_id: int, wallets_data: Dict[str, dict] = None):
+    """
+    Балансы портфеля — список целых минимальных единиц и индекс
+    валюта -> ячейка. Объекты Wallet создаются лениво, только когда
+    к ним обращаются.
+    """
+    __slots__ = ("_user_id", "_index", "_codes", "_precisions", "_balances",
+                 "_wallets", "_wallets_view", "version")
+
+    def __init__(self, user_id: int, wallets_data: Dict[str, dict] = None,
+                 version: int = 0):
         self._user_id = user_id
+        # Версия записи в хранилище на момент загрузки (оптимистическая
+        # блокировка при сохранении)
+        self.version = version
+        self._index: Dict[str, int] = {}
+        self._codes: List[str] = []
+        self._precisions: List[int] = []
+        self._balances: List[int] = []
         self._wallets: Dict[str, Wallet] = {}
+        self._wallets_view = MappingProxyType(self._wallets)
 
         if wallets_data:
-            for code, data in wallets_data.items():
-                self._wallets[code] = Wallet(data['currency_code'], data['balance'])
+            for data in wallets_data.values():
+                code = data['currency_code'].upper()
+                slot = self._add_slot(code)
+                if 'balance_units' in data:
+                    self._balances[slot] = int(data['balance_units'])
+                else:
+                    # Старый формат: только float-баланс
+                    self._balances[slot] = to_units(data['balance'],
+                                                    self._precisions[slot])
+
+    def _add_slot(self, code: str) -> int:
+        slot = len(self._codes)
+        self._index[code] = slot
+        self._codes.append(code)
+        self._precisions.append(precision_of(code))
+        self._balances.append(0)
+        return slot
+
+    def _wallet(self, code: str) -> Wallet:
+        wallet = self._wallets.get(code)
+        if wallet is None:
+            slot = self._index[code]
+            wallet = Wallet._bind(code, self._balances, slot,
+                                  self._precisions[slot])
+            self._wallets[code] = wallet
+        return wallet
 
     @property
     def user(self) -> int:
         return self._user_id
 
     @property
-    def wallets(self) -> Dict[str, Wallet]:
-        return self._wallets.copy()
+    def wallets(self) -> Mapping[str, Wallet]:
+        """Представление только для чтения (без копирования)"""
+        if len(self._wallets) != len(self._codes):
+            for code in self._codes:
+                self._wallet(code)
+        return self._wallets_view
 
     @property
     def user_id(self) -> int:
         return self._user_id
 
-    def get_wallet(self, currency_code: str) -> Wallet:
-        return self._wallets.get(currency_code.upper())
+    def balances(self) -> Iterator[Tuple[str, float]]:
+        """(код, баланс) без создания объектов Wallet"""
+        for code, units, precision in zip(self._codes, self._balances,
+                                          self._precisions):
+            yield code, units_to_float(units, precision)
+
+    def get_wallet(self, currency_code: str) -> Optional[Wallet]:
+        code = currency_code.upper()
+        # Кошелек обычно уже создан: один поиск в словаре вместо двух
+        wallet = self._wallets.get(code)
+        if wallet is None and code in self._index:
+            wallet = self._wallet(code)
+        return wallet
 
     def add_currency(self, currency_code: str) -> Wallet:
         code = currency_code.upper()
-        if code not in self._wallets:
-            new_wallet = Wallet(code, 0.0)
-            self._wallets[code] = new_wallet
-        return self._wallets[code]
+        wallet = self._wallets.get(code)
+        if wallet is None:
+            if code not in self._index:
+                self._add_slot(code)
+            wallet = self._wallet(code)
+        return wallet
+
+    def copy(self) -> "Portfolio":
+        """Независимая копия балансов (для изменений с откатом)"""
+        clone = Portfolio(self._user_id, version=self.version)
+        clone._index = dict(self._index)
+        clone._codes = list(self._codes)
+        clone._precisions = list(self._precisions)
+        clone._balances = list(self._balances)
+        return clone
 
-    def get_total_value(self, rates: dict, base_currency='USD') -> float:
+    def get_total_value(self, matrix, base_currency='USD') -> float:
+        """matrix — core.conversion.ConversionMatrix (кросс-курсы)"""
         total = 0.0
-        for wallet in self._wallets.values():
-            if wallet.currency_code == base_currency:
-                total += wallet.balance
-            else:
-                pair = f"{wallet.currency_code}_{base_currency}"
-                rate = rates.get(pair, {}).get('rate', 0.0)
-                total += wallet.balance * rate
+        for code, balance in self.balances():
+            total += balance * matrix.rate(code, base_currency)
         return total
 
     def to_dict(self) -> dict:
-        return {
-            "user_id": self._user_id,
-            "wallets": {code: w.to_dict() for code, w in self._wallets.items()}
-        }
\ No newline at end of file
+        wallets = {}
+        for code, units, precision in zip(self._codes, self._balances,
+                                          self._precisions):
+            wallets[code] = {"currency_code": code,
+                             "balance": units_to_float(units, precision),
+                             "balance_units": units}
+        return {"user_id": self._user_id, "wallets": wallets,
+                "version": self.version}
@@ -1,13 +1,35 @@
+import logging
+import os
+import random
+import time
 from datetime import datetime, timezone
 
-from valutatrade_hub.decorators import log_action
+from valutatrade_hub.decorators import log_action, timed
 from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.journal import TradeJournal
+from valutatrade_hub.infra.rates_cache import RatesCache
 from valutatrade_hub.infra.settings import SettingsLoader
+from valutatrade_hub.parser_service.refresher import BackgroundRefresher
 
+from .conversion import ConversionMatrix
 from .currencies import get_currency
-from .exceptions import ApiRequestError, InsufficientFundsError
+from .exceptions import (
+    ApiRequestError,
+    ConcurrentModificationError,
+    CurrencyNotFoundError,
+    InsufficientFundsError,
+)
 from .models import Portfolio, User
 from .utils import generate_salt, hash_password
+from .valuation import revalue_all, write_report
+
+logger = logging.getLogger("ValutaTrade")
+
+
+class _BatchRejected(Exception):
+    def __init__(self, report):
+        self.report = report
+        super().__init__("batch rejected")
 
 
 class SystemCore:
@@ -16,37 +38,36 @@ class SystemCore:
         self._current_portfolio = None
         self.db = DatabaseManager()
         self.settings = SettingsLoader()
+        self.rates_cache = RatesCache()
+        self.journal = TradeJournal()  # при первом создании доигрывает хвост
+        self.matrix = ConversionMatrix(self.settings.get("BASE_CURRENCY"))
 
     @property
     def current_user(self):
         return self._current_user
 
     def register(self, username, password):
-        users = self.db.load_users()
-        if any(u['username'] == username for u in users):
+        if self.db.get_user(username):
             raise ValueError(f"Имя пользователя '{username}' уже занято")
 
         if len(password) < 4:
             raise ValueError("Пароль должен быть не короче 4 символов")
 
-        new_id = len(users) + 1
+        new_id = self.db.next_user_id()
         salt = generate_salt()
         hashed = hash_password(password, salt)
         reg_date = datetime.now().isoformat()
 
         user = User(new_id, username, hashed, salt, reg_date)
-        users.append(user.to_dict())
-        self.db.save_users(users)
-
-        portfolios = self.db.load_portfolios()
-        portfolios.append({"user_id": new_id, "wallets": {}})
-        self.db.save_portfolios(portfolios)
+        # Хранилище может выдать другой id, если его уже занял
+        # параллельно зарегистрированный пользователь
+        new_id = self.db.add_user(user.to_dict())
+        self.db.save_portfolio({"user_id": new_id, "wallets": {}})
 
         return new_id
 
     def login(self, username, password):
-        users_data = self.db.load_users()
-        user_record = next((u for u in users_data if u['username'] == username), None)
+        user_record = self.db.get_user(username)
 
         if not user_record:
             raise ValueError(f"Пользователь '{username}' не найден")
@@ -63,30 +84,89 @@ class SystemCore:
     def _load_portfolio(self):
         if not self._current_user:
             return
-        all_p = self.db.load_portfolios()
-        p_data = next(
-            (p for p in all_p if p['user_id'] == self._current_user.user_id)
-            , None)
+        p_data = self.db.get_portfolio(self._current_user.user_id)
         if p_data:
-            self._current_portfolio = Portfolio(p_data['user_id'], p_data['wallets'])
+            self._current_portfolio = self._portfolio_from(p_data)
         else:
             self._current_portfolio = Portfolio(self._current_user.user_id, {})
 
-    def _save_portfolio(self):
-        if not self._current_portfolio:
-            return
-        all_p = self.db.load_portfolios()
-        for i, p in enumerate(all_p):
-            if p['user_id'] == self._current_user.user_id:
-                all_p[i] = self._current_portfolio.to_dict()
-                break
-        else:
-            all_p.append(self._current_portfolio.to_dict())
-        self.db.save_portfolios(all_p)
+    @staticmethod
+    def _portfolio_from(p_data: dict) -> Portfolio:
+        return Portfolio(p_data['user_id'], p_data['wallets'],
+                         p_data.get('version', 0))
+
+    def _run_trade(self, op, apply, describe):
+        """
+        Применяет apply(portfolio, matrix) к копии портфеля и сохраняет ее с
+        проверкой версии. Итог пишется в журнал сделок под блокировкой
+        портфеля, после проверки версии, — в журнал попадают только
+        выигравшие попытки; describe(result) дает детали сделки для записи.
+        Если портфель после записи журнала сохранить не удалось, запись
+        отменяется (TradeJournal.abort). Если портфель успел изменить другой процесс,
+        после случайной паузы перечитывает его и повторяет (не более
+        TRADE_MAX_RETRIES раз). Последняя попытка при конфликте применяет
+        сделку заново к сохраненному портфелю прямо под его блокировкой,
+        поэтому сделка не теряется, даже если конкуренты все время успевают
+        раньше.
+        """
+        retries = self.settings.get("TRADE_MAX_RETRIES", 5)
+        backoff = self.settings.get("TRADE_RETRY_BACKOFF", 0.002)
+        backoff_max = self.settings.get("TRADE_RETRY_BACKOFF_MAX", 0.1)
+        for attempt in range(retries + 1):
+            work = self._current_portfolio.copy()
+            result = apply(work, self._get_matrix())
+
+            def rebase(current):
+                nonlocal work, result
+                work = self._portfolio_from(current)
+                result = apply(work, self._get_matrix())
+                return work.to_dict()
+
+            journaled = []
+
+            def write_journal(record):
+                journaled.append(self.journal.append(op, record,
+                                                     describe(result)))
+
+            try:
+                with self.journal.transaction():
+                    try:
+                        work.version = self.db.save_portfolio(
+                            work.to_dict(), expected_version=work.version,
+                            before_write=write_journal,
+                            rebase=rebase if attempt == retries else None)
+                    except Exception:
+                        if journaled:
+                            self._abort_journaled(journaled[-1], work.user_id)
+                        raise
+            except ConcurrentModificationError:
+                # Экспоненциальная пауза со случайным разбросом, чтобы
+                # конкуренты не сталкивались снова в том же порядке
+                time.sleep(random.uniform(0, min(backoff * 2 ** attempt,
+                                                 backoff_max)))
+                self._load_portfolio()
+                continue
+            except Exception:
+                self._load_portfolio()
+                raise
+            self._current_portfolio = work
+            return result
+
+    def _abort_journaled(self, entry_id, user_id):
+        try:
+            self.journal.abort(entry_id, user_id)
+        except OSError as e:
+            # Исходную ошибку сделки не подменяем; без отметки повтор
+            # журнала может применить сделку
+            logger.error(f"JOURNAL abort failed id={entry_id}: {e}")
 
     def _get_rates_data(self):
-        data = self.db.load_rates()
-        return data.get("pairs", data)
+        return self.rates_cache.get_pairs()
+
+    def _get_matrix(self) -> ConversionMatrix:
+        # Пока кэш отдает тот же снимок, update() ничего не делает
+        self.matrix.update(self._get_rates_data())
+        return self.matrix
 
     def get_portfolio_info(self, base_currency='USD'):
         if not self._current_user:
@@ -95,32 +175,41 @@ class SystemCore:
         # Проверяем, существует ли базовая валюта
         get_currency(base_currency)
 
-        rates = self._get_rates_data()
-        total = self._current_portfolio.get_total_value(rates, base_currency)
+        matrix = self._get_matrix()
 
         wallet_info = []
-        for code, wallet in self._current_portfolio.wallets.items():
+        total = 0.0
+        for code, balance in self._current_portfolio.balances():
             curr_obj = get_currency(code)
 
-            val_in_base = wallet.balance
-            if code != base_currency:
-                rate = rates.get(f"{code}_{base_currency}", {}).get('rate', 0.0)
-                val_in_base = wallet.balance * rate
+            val_in_base = balance * matrix.rate(code, base_currency)
+            total += val_in_base
 
             wallet_info.append({
                 "code": code,
-                "balance": wallet.balance,
+                "balance": balance,
                 "value": val_in_base,
                 "display": curr_obj.get_display_info()
             })
 
         return wallet_info, total
 
-    @log_action("BUY")
-    def buy_currency(self, currency_code: str, amount: float):
-        if not self._current_user:
-            raise PermissionError("Сначала выполните login")
-
+    def revalue_all(self, bases=None, output=None):
+        """Переоценка всех портфелей (mark-to-market) с отчетом в CSV"""
+        bases = [b.upper() for b in (bases or [self.settings.get("BASE_CURRENCY")])]
+        for base in bases:
+            get_currency(base)
+
+        if not output:
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            output = os.path.join(self.settings.get("REPORTS_DIR"),
+                                  f"revalue-{stamp}.csv")
+        rows = revalue_all(self.db.load_portfolios(), self._get_matrix(), bases)
+        count = write_report(output, bases, rows)
+        return count, output
+
+    def _buy_leg(self, portfolio: Portfolio, matrix: ConversionMatrix,
+                 currency_code: str, amount: float):
         # Валидация валюты
         get_currency(currency_code)
 
@@ -129,79 +218,177 @@ class SystemCore:
 
         base_curr = self.settings.get("BASE_CURRENCY")
 
-        rates = self._get_rates_data()
-        pair = f"{currency_code}_{base_curr}"
-        rate_info = rates.get(pair)
+        rate = matrix.rate(currency_code, base_curr)
 
-        if not rate_info:
-            rate_info = {"rate": 100.0}  # for test
+        if not rate:
+            rate = 100.0  # for test
             # raise ApiRequestError("Курс не найден")
 
-        rate = rate_info['rate']
         cost_in_base = amount * rate
 
-        base_wallet = self._current_portfolio.add_currency(base_curr)
+        base_wallet = portfolio.add_currency(base_curr)
 
         # for test
         if base_wallet.balance == 0:
             base_wallet.deposit(cost_in_base + 1000)
 
-        target_wallet = self._current_portfolio.add_currency(currency_code)
-
-        base_wallet.withdraw(cost_in_base)
-        target_wallet.deposit(amount)
-
-        self._save_portfolio()
+        target_wallet = portfolio.add_currency(currency_code)
+
+        # Кошельки сами переводят суммы в минимальные единицы (один раз на
+        # операцию). Если зачисление отклонено (сумма меньше минимальной
+        # единицы), списание откатывается: нога применяется целиком
+        cost_in_base = base_wallet.withdraw_value(cost_in_base)
+        try:
+            target_wallet.deposit(amount)
+        except ValueError:
+            base_wallet.deposit_value(cost_in_base)
+            raise
         return rate, cost_in_base
 
-    @log_action("SELL")
-    def sell_currency(self, currency_code: str, amount: float):
-        if not self._current_user:
-            raise PermissionError("Сначала выполните login")
-
+    def _sell_leg(self, portfolio: Portfolio, matrix: ConversionMatrix,
+                  currency_code: str, amount: float):
         get_currency(currency_code)  # Valid check
 
-        wallet = self._current_portfolio.get_wallet(currency_code)
+        wallet = portfolio.get_wallet(currency_code)
         if not wallet:
             raise InsufficientFundsError(amount, 0, currency_code)
 
         base_curr = self.settings.get("BASE_CURRENCY")
 
-        rates = self._get_rates_data()
-        pair = f"{currency_code}_{base_curr}"
-        rate = rates.get(pair, {}).get('rate', 0.0)
+        rate = matrix.rate(currency_code, base_curr)
 
         revenue = amount * rate
 
         if revenue <= 0:
+            pair = f"{currency_code}_{base_curr}".upper()
             raise ApiRequestError(f"Невозможно продать: курс {pair} "
                                   f"равен 0 или не найден.")
 
         # Списание (проверка баланса внутри withdraw)
         wallet.withdraw(amount)
 
-        # Начисление
-        base_wallet = self._current_portfolio.add_currency(base_curr)
-        base_wallet.deposit(revenue)
-
-        self._save_portfolio()
+        # Начисление; если оно отклонено, списание откатывается
+        base_wallet = portfolio.add_currency(base_curr)
+        try:
+            revenue = base_wallet.deposit_value(revenue)
+        except ValueError:
+            wallet.deposit(amount)
+            raise
         return rate, revenue
 
+    @timed("buy_currency")
+    @log_action("BUY")
+    def buy_currency(self, currency_code: str, amount: float):
+        if not self._current_user:
+            raise PermissionError("Сначала выполните login")
+
+        return self._run_trade("BUY", lambda portfolio, matrix: self._buy_leg(
+            portfolio, matrix, currency_code, amount),
+            lambda result: self._trade_details(currency_code, amount, result))
+
+    @timed("sell_currency")
+    @log_action("SELL")
+    def sell_currency(self, currency_code: str, amount: float):
+        if not self._current_user:
+            raise PermissionError("Сначала выполните login")
+
+        return self._run_trade("SELL", lambda portfolio, matrix: self._sell_leg(
+            portfolio, matrix, currency_code, amount),
+            lambda result: self._trade_details(currency_code, amount, result))
+
+    @staticmethod
+    def _trade_details(currency_code, amount, result):
+        rate, value = result
+        return {"currency": currency_code.upper(), "amount": amount,
+                "rate": rate, "value": value}
+
+    def execute_batch(self, orders):
+        """
+        Пакет сделок [{'side': 'buy'|'sell', 'currency': .., 'amount': ..}]:
+        все ноги оцениваются по одному снимку курсов и применяются к копии
+        портфеля; сохранение одно и только если прошли все ноги.
+        Возвращает (committed, [отчет по каждой ноге]).
+        """
+        if not self._current_user:
+            raise PermissionError("Сначала выполните login")
+
+        legs = {"buy": self._buy_leg, "sell": self._sell_leg}
+
+        def apply(work, matrix):
+            report, failed = [], False
+            for n, order in enumerate(orders, 1):
+                side = str(order.get("side", "")).lower()
+                currency = str(order.get("currency", "")).upper()
+                leg = {"leg": n, "side": side, "currency": currency,
+                       "amount": order.get("amount")}
+                try:
+                    if side not in legs:
+                        raise ValueError(f"Неизвестная операция '{side}'")
+                    amount = float(order.get("amount"))
+                    rate, value = legs[side](work, matrix, currency, amount)
+                    leg.update(amount=amount, rate=rate, value=value, status="OK")
+                except (ValueError, TypeError, InsufficientFundsError,
+                        CurrencyNotFoundError, ApiRequestError) as e:
+                    leg.update(status="ERROR", error=str(e))
+                    failed = True
+                report.append(leg)
+
+            if failed or not report:
+                # Отказ: исключение откатывает копию, сохранения не будет
+                raise _BatchRejected(report)
+            return report
+
+        username = self._current_user.username
+        try:
+            report = self._run_trade("BATCH", apply, lambda report: {"legs": [
+                {key: leg[key] for key in
+                 ("side", "currency", "amount", "rate", "value")}
+                for leg in report]})
+        except _BatchRejected as rejected:
+            logger.error(f"BATCH user='{username}' legs={len(rejected.report)} "
+                         f"result=REJECTED",
+                         extra={"action": "BATCH", "user": username,
+                                "result": "REJECTED"})
+            return False, rejected.report
+
+        for leg in report:
+            logger.info(f"{leg['side'].upper()} user='{username}' "
+                        f"currency='{leg['currency']}' amount={leg['amount']} "
+                        f"rate={leg['rate']} val={leg['value']:.2f} "
+                        f"result=OK batch=1",
+                        extra={"action": leg['side'].upper(), "user": username,
+                               "currency": leg['currency'],
+                               "amount": leg['amount'], "rate": leg['rate'],
+                               "value": leg['value'], "result": "OK",
+                               "batch": True})
+        return True, report
+
+    @timed("get_rate")
     def get_rate(self, from_curr, to_curr):
         # Валидация
         get_currency(from_curr)
         get_currency(to_curr)
 
-        rates = self._get_rates_data()
         pair = f"{from_curr}_{to_curr}".upper()
-        data = rates.get(pair)
-
-        if data:
-            updated = datetime.fromisoformat(data['updated_at'])
+        # Прямой, обратный или кросс-курс (для кросс-курса — время и
+        # источник самого старого звена)
+        quote = self._get_matrix().lookup(from_curr, to_curr)
+
+        if quote and quote[1] is None:  # одна и та же валюта
+            return 1.0, datetime.now(timezone.utc).isoformat(), True
+
+        if quote:
+            rate, updated_at, source = quote
+            updated = datetime.fromisoformat(updated_at)
+            # Источник мог подтвердить курс ответом 304 позже updated_at
+            validated_at = self.rates_cache.get_validated().get(source)
+            if validated_at:
+                updated = max(updated, datetime.fromisoformat(validated_at))
             ttl = self.settings.get("RATES_TTL")
-            if (datetime.now(timezone.utc) - updated).total_seconds() > ttl:
-                # todo
-                pass
-            return data['rate'], data['updated_at']
+            is_fresh = (datetime.now(timezone.utc) - updated).total_seconds() <= ttl
+            if not is_fresh and self.settings.get("RATES_AUTO_REFRESH"):
+                # stale-while-revalidate: отдаем старый курс, обновляем в фоне
+                BackgroundRefresher().trigger()
+            return rate, updated_at, is_fresh
 
         raise ApiRequestError(f"Курс {pair} не найден в базе")
\ No newline at end of file
@@ -1,10 +1,10 @@
-import hashlib
-import uuid
+import os
 
 
 def generate_salt() -> str:
-    return uuid.uuid4().hex[:8]  # Простая случайная строка
+    return os.urandom(4).hex()  # Простая случайная строка (8 hex-символов)
 
 
 def hash_password(password: str, salt: str) -> str:
+    import hashlib  # нужен только при регистрации и входе
     return hashlib.sha256((password + salt).encode()).hexdigest()
\ No newline at end of file
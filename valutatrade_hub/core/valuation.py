@@ -0,0 +1,88 @@
+import csv
+import os
+from array import array
+from itertools import islice
+from operator import mul
+from typing import Iterable, List
+
+from .conversion import ConversionMatrix
+
+
+class BalanceMatrix:
+    """
+    Балансы всех портфелей одной матрицей users x currencies
+    (row-major array('d')); колонки — в порядке ConversionMatrix.codes,
+    неизвестные матрице валюты добавляются в конец.
+    """
+
+    def __init__(self, portfolios: Iterable[dict], codes: List[str]):
+        self.codes = list(codes)
+        index = {c: i for i, c in enumerate(self.codes)}
+        rows = []
+        for record in portfolios:
+            row = {}
+            for code, wallet in record.get('wallets', {}).items():
+                code = code.upper()
+                if code not in index:
+                    index[code] = len(self.codes)
+                    self.codes.append(code)
+                row[index[code]] = float(wallet['balance'])
+            rows.append((record['user_id'], row))
+
+        self.width = len(self.codes)
+        self.user_ids = array('q', (uid for uid, _ in rows))
+        self.balances = array('d', [0.0]) * (len(rows) * self.width)
+        for r, (_, row) in enumerate(rows):
+            offset = r * self.width
+            for col, balance in row.items():
+                self.balances[offset + col] = balance
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def totals(self, vectors: List[array]) -> Iterable[tuple]:
+        """
+        За один проход по строкам: (user_id, [итог по каждому вектору]).
+        Произведение строки на вектор курсов — sum(map(mul, ...)) на C-уровне.
+        """
+        width = self.width
+        view = memoryview(self.balances)
+        for r, uid in enumerate(self.user_ids):
+            row = view[r * width:(r + 1) * width]
+            yield uid, [sum(map(mul, row, vec)) for vec in vectors]
+
+
+def rates_vector(matrix: ConversionMatrix, base: str, codes: List[str]) -> array:
+    """
+    Курсы codes -> base; валюты без курса оцениваются в 0. Сама base —
+    всегда 1.0, даже если для нее нет ни одного курса в матрице.
+    """
+    column = matrix.column(base) or array('d', [0.0]) * len(matrix.codes)
+    vector = array('d', islice(column, len(codes)))
+    vector.extend([0.0] * (len(codes) - len(vector)))
+    base = base.upper()
+    if base in codes:
+        vector[codes.index(base)] = 1.0
+    return vector
+
+
+def revalue_all(portfolios: Iterable[dict], matrix: ConversionMatrix,
+                bases: List[str]) -> Iterable[tuple]:
+    """Итоги всех портфелей сразу в нескольких базовых валютах"""
+    balances = BalanceMatrix(portfolios, matrix.codes)
+    vectors = [rates_vector(matrix, base, balances.codes) for base in bases]
+    return balances.totals(vectors)
+
+
+def write_report(path: str, bases: List[str], rows: Iterable[tuple]) -> int:
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["user_id"] + [f"total_{b}" for b in bases])
+        for uid, totals in rows:
+            writer.writerow([uid] + [f"{t:.8f}" for t in totals])
+            count += 1
+    return count
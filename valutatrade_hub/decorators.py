@@ -1,44 +1,105 @@
 import functools
+import time
 
 from valutatrade_hub.logging_config import logger
+from valutatrade_hub.metrics import MetricsRegistry
 
 
 def log_action(action_name):
     """
     Декоратор для логирования действий (BUY, SELL, etc.)
+    Запись уходит в очередь логгера, на диск ее пишет отдельный поток.
     """
 
     def decorator(func):
+        # Позиции параметров: CLI и пакетный режим передают их позиционно.
+        # Под другими декораторами (functools.wraps) берем исходную функцию
+        target = func
+        while hasattr(target, "__wrapped__"):
+            target = target.__wrapped__
+        code = target.__code__
+        params = code.co_varnames[:code.co_argcount]
+
+        def argument(name, args, kwargs, default):
+            if name in kwargs:
+                return kwargs[name]
+            if name in params and params.index(name) < len(args):
+                return args[params.index(name)]
+            return default
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             _self = args[0]
             username = _self.current_user.username if _self.current_user else "GUEST"
 
             # Собираем параметры для лога
-            currency = kwargs.get('currency_code', 'N/A')
-            amount = kwargs.get('amount', 0)
+            currency = argument('currency_code', args, kwargs, 'N/A')
+            amount = argument('amount', args, kwargs, 0)
+            fields = {"action": action_name, "user": username,
+                      "currency": currency, "amount": amount}
 
+            started = time.perf_counter()
             try:
                 result = func(*args, **kwargs)
+                fields["latency_ms"] = round(
+                    (time.perf_counter() - started) * 1000, 3)
 
                 rate_info = ""
                 if isinstance(result, tuple) and len(result) >= 1:
                     rate_info = f"rate={result[0]} val={result[1]:.2f}"
+                    fields.update(rate=result[0], value=result[1])
 
                 msg = (f"{action_name} user='{username}' currency='{currency}' "
                        f"amount={amount} {rate_info} result=OK")
-                logger.info(msg)
+                logger.info(msg, extra=dict(fields, result="OK"))
 
                 return result
 
             except Exception as e:
                 # Логируем ошибку и пробрасываем дальше
+                fields["latency_ms"] = round(
+                    (time.perf_counter() - started) * 1000, 3)
                 error_type = type(e).__name__
                 msg = (f"{action_name} user='{username}' currency='{currency}' "
                        f"amount={amount} result=ERROR error={error_type} msg='{e}'")
-                logger.error(msg)
+                logger.error(msg, extra=dict(fields, result="ERROR",
+                                             error=error_type))
                 raise e
 
         return wrapper
 
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def timed(metric, **labels):
+    """
+    Декоратор метрик: гистограмма длительности <metric>_seconds (ее _count —
+    число вызовов) и счетчик <metric>_errors_total. Если метрики выключены
+    (METRICS_ENABLED), обертка только вызывает функцию.
+    """
+
+    def decorator(func):
+        histogram = errors = None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            nonlocal histogram, errors
+            if histogram is None:
+                registry = MetricsRegistry()
+                if not registry.enabled:
+                    return func(*args, **kwargs)
+                histogram = registry.histogram(f"{metric}_seconds", **labels)
+                errors = registry.counter(f"{metric}_errors_total", **labels)
+
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,372 @@
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from valutatrade_hub.core.exceptions import ConcurrentModificationError
+
+from .files import file_stamp
+from .locks import file_lock
+
+
+class StorageBackend(ABC):
+    """Хранилище пользователей и портфелей для DatabaseManager"""
+
+    @abstractmethod
+    def load_users(self) -> List[dict]:
+        pass
+
+    @abstractmethod
+    def save_users(self, data: List[dict]):
+        pass
+
+    @abstractmethod
+    def load_portfolios(self) -> List[dict]:
+        pass
+
+    @abstractmethod
+    def save_portfolios(self, data: List[dict]):
+        pass
+
+    # Точечные операции: используются в горячем пути (register/login/trade)
+    @abstractmethod
+    def get_user(self, username: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def get_user_by_id(self, user_id: int) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def add_user(self, record: dict) -> int:
+        """Добавляет пользователя; возвращает фактически выданный user_id"""
+        pass
+
+    @abstractmethod
+    def next_user_id(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_portfolio(self, user_id: int) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def save_portfolio(self, record: dict, expected_version: int = None,
+                       before_write=None, rebase=None) -> int:
+        """
+        Сохраняет портфель и возвращает его новую версию. Если передан
+        expected_version, а в хранилище другая версия —
+        ConcurrentModificationError (оптимистическая блокировка), либо,
+        если передан rebase(current), запись строится им заново из
+        сохраненного портфеля под той же блокировкой.
+        before_write(record) получает итоговую запись (с новой version)
+        после проверки версии под блокировкой записи — журнал сделок пишет
+        туда только выигравшие попытки; его исключение отменяет сохранение.
+        """
+        pass
+
+
+class JsonBackend(StorageBackend):
+    """
+    JSON-файлы: users.json целиком, портфели — по файлу на пользователя
+    (data/portfolios/<shard>/<user_id>.json), чтобы сделка перезаписывала
+    только кошельки одного пользователя.
+    """
+
+    SHARDS = 256
+
+    def __init__(self, db, settings):
+        self._db = db
+        self._users_file = settings.get("USERS_FILE")
+        self._portfolios_file = settings.get("PORTFOLIOS_FILE")
+        self._portfolios_dir = settings.get("PORTFOLIOS_DIR")
+        self._ensure_sharded()
+
+        # Индекс users.json: перестраивается только при смене mtime/size файла
+        self._users_lock = threading.Lock()
+        self._users_stamp = None
+        self._users = []
+        self._by_name = {}
+        self._by_id = {}
+        self._last_user_id = 0
+
+    def _ensure_sharded(self):
+        """Однократно раскладывает legacy portfolios.json по шардам"""
+        if os.path.isdir(self._portfolios_dir):
+            return
+        legacy = self._db._read_json(self._portfolios_file, [])
+        # Свой временный каталог на процесс: параллельный запуск может
+        # раскладывать шарды одновременно, побеждает первый os.replace
+        tmp_dir = f"{self._portfolios_dir}.tmp-{os.getpid()}"
+        try:
+            self._write_shards(legacy, tmp_dir)
+            os.makedirs(tmp_dir, exist_ok=True)
+            os.replace(tmp_dir, self._portfolios_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(self._portfolios_dir):
+                raise
+
+    def _shard_path(self, user_id: int, root: str = None) -> str:
+        shard = f"{int(user_id) % self.SHARDS:02x}"
+        return os.path.join(root or self._portfolios_dir, shard, f"{user_id}.json")
+
+    def _write_shards(self, records: List[dict], root: str = None):
+        for record in records:
+            path = self._shard_path(record['user_id'], root)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db._write_json(path, record)
+
+    def _index_users(self, users: List[dict]):
+        self._users = users
+        self._by_name = {u['username']: u for u in users}
+        self._by_id = {u['user_id']: u for u in users}
+        self._last_user_id = max(self._by_id, default=0)
+        self._users_stamp = file_stamp(self._users_file)
+
+    def _ensure_users_index(self):
+        """Вызывается под self._users_lock"""
+        if (self._users_stamp is None
+                or file_stamp(self._users_file) != self._users_stamp):
+            self._index_users(self._db._read_json(self._users_file, []))
+
+    def load_users(self):
+        with self._users_lock:
+            self._ensure_users_index()
+            return [dict(u) for u in self._users]
+
+    def save_users(self, data):
+        with self._users_lock:
+            self._db._write_json(self._users_file, data)
+            self._index_users([dict(u) for u in data])
+
+    def load_portfolios(self):
+        records = []
+        for shard in sorted(os.listdir(self._portfolios_dir)):
+            shard_dir = os.path.join(self._portfolios_dir, shard)
+            for name in os.listdir(shard_dir):
+                if name.endswith(".json"):
+                    record = self._db._read_json(os.path.join(shard_dir, name), {})
+                    if record:
+                        records.append(record)
+        records.sort(key=lambda p: p['user_id'])
+        return records
+
+    def save_portfolios(self, data):
+        self._write_shards(data)
+
+    def get_user(self, username):
+        with self._users_lock:
+            self._ensure_users_index()
+            record = self._by_name.get(username)
+        return dict(record) if record else None
+
+    def get_user_by_id(self, user_id):
+        with self._users_lock:
+            self._ensure_users_index()
+            record = self._by_id.get(user_id)
+        return dict(record) if record else None
+
+    def add_user(self, record):
+        with self._users_lock, file_lock(self._users_file + ".lock"):
+            # Под замком сверяем отпечаток файла: если его переписал другой
+            # процесс, индекс перечитывается, и проверки имени и id надежны.
+            # Свою же запись (стамп снят после нее) не перечитываем
+            self._ensure_users_index()
+            if record['username'] in self._by_name:
+                raise ValueError(
+                    f"Имя пользователя '{record['username']}' уже занято")
+            record = dict(record)
+            if record['user_id'] in self._by_id:
+                record['user_id'] = self._last_user_id + 1
+            self._db._write_json(self._users_file, self._users + [record])
+            self._index_users(self._users + [record])
+            return record['user_id']
+
+    def next_user_id(self):
+        with self._users_lock:
+            self._ensure_users_index()
+            return self._last_user_id + 1
+
+    def get_portfolio(self, user_id):
+        return self._db._read_json(self._shard_path(user_id), {}) or None
+
+    def save_portfolio(self, record, expected_version=None, before_write=None,
+                       rebase=None):
+        path = self._shard_path(record['user_id'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with file_lock(path + ".lock"):
+            current = self._db._read_json(path, {})
+            version = current.get('version', 0) if current else 0
+            if expected_version is not None and version != expected_version:
+                if rebase is None:
+                    raise ConcurrentModificationError(record['user_id'])
+                record = rebase(current or {"user_id": record['user_id'],
+                                            "wallets": {}, "version": 0})
+            record = dict(record, version=version + 1)
+            if before_write:
+                before_write(record)
+            self._db._write_json(path, record)
+        return version + 1
+
+
+class SqliteBackend(StorageBackend):
+    """SQLite (WAL): PK по user_id, уникальный индекс по username"""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            hashed_password TEXT NOT NULL,
+            salt TEXT NOT NULL,
+            registration_date TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username);
+        CREATE TABLE IF NOT EXISTS portfolios (
+            user_id INTEGER PRIMARY KEY,
+            wallets TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+    """
+    _USER_COLUMNS = ("user_id", "username", "hashed_password",
+                     "salt", "registration_date")
+
+    def __init__(self, db_path: str):
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        import sqlite3  # только для этого бэкенда
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        columns = {r['name'] for r in
+                   self._conn.execute("PRAGMA table_info(portfolios)")}
+        if "version" not in columns:  # БД, созданная до версионирования
+            self._conn.execute("ALTER TABLE portfolios "
+                               "ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def _user_row(self, record: dict) -> tuple:
+        return tuple(record[c] for c in self._USER_COLUMNS)
+
+    @staticmethod
+    def _portfolio_row(record: dict) -> tuple:
+        return (record['user_id'],
+                json.dumps(record.get('wallets', {}), ensure_ascii=False),
+                record.get('version', 0))
+
+    @staticmethod
+    def _portfolio_from_row(row) -> dict:
+        return {"user_id": row['user_id'], "wallets": json.loads(row['wallets']),
+                "version": row['version']}
+
+    def load_users(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM users ORDER BY user_id").fetchall()
+        return [dict(r) for r in rows]
+
+    def save_users(self, data):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM users")
+            self._conn.executemany(
+                "INSERT INTO users VALUES (?, ?, ?, ?, ?)",
+                [self._user_row(u) for u in data])
+
+    def load_portfolios(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM portfolios ORDER BY user_id").fetchall()
+        return [self._portfolio_from_row(r) for r in rows]
+
+    def save_portfolios(self, data):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM portfolios")
+            self._conn.executemany(
+                "INSERT INTO portfolios VALUES (?, ?, ?)",
+                [self._portfolio_row(p) for p in data])
+
+    def get_user(self, username):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        return dict(row) if row else None
+
+    def get_user_by_id(self, user_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    def add_user(self, record):
+        import sqlite3
+        row = self._user_row(record)
+        try:
+            with self._lock, self._conn:
+                if self._conn.execute("SELECT 1 FROM users WHERE user_id = ?",
+                                      (record['user_id'],)).fetchone():
+                    # id занят параллельной регистрацией: выдаст SQLite
+                    row = (None,) + row[1:]
+                cursor = self._conn.execute(
+                    "INSERT INTO users VALUES (?, ?, ?, ?, ?)", row)
+                return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            raise ValueError(
+                f"Имя пользователя '{record['username']}' уже занято")
+
+    def next_user_id(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(MAX(user_id), 0) + 1 FROM users").fetchone()
+        return row[0]
+
+    def get_portfolio(self, user_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM portfolios WHERE user_id = ?", (user_id,)).fetchone()
+        return self._portfolio_from_row(row) if row else None
+
+    def save_portfolio(self, record, expected_version=None, before_write=None,
+                       rebase=None):
+        user_id = record['user_id']
+        with self._lock, self._conn:
+            # Блокировка записи БД сразу: проверка версии, before_write и
+            # запись — одна транзакция для всех процессов
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT * FROM portfolios WHERE user_id = ?",
+                (user_id,)).fetchone()
+            version = row['version'] if row else 0
+            if expected_version is not None and version != expected_version:
+                if rebase is None:
+                    raise ConcurrentModificationError(user_id)
+                record = rebase(self._portfolio_from_row(row) if row else
+                                {"user_id": user_id, "wallets": {}, "version": 0})
+            record = dict(record, version=version + 1)
+            if before_write:
+                before_write(record)
+            _, wallets, _ = self._portfolio_row(record)
+            if row:
+                self._conn.execute(
+                    "UPDATE portfolios SET wallets = ?, version = ? "
+                    "WHERE user_id = ?", (wallets, version + 1, user_id))
+            else:
+                self._conn.execute("INSERT INTO portfolios VALUES (?, ?, ?)",
+                                   (user_id, wallets, version + 1))
+            return version + 1
+
+    def import_records(self, users: List[dict], portfolios: List[dict]):
+        """Одной транзакцией заменяет содержимое БД (для миграции)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM users")
+            self._conn.execute("DELETE FROM portfolios")
+            self._conn.executemany(
+                "INSERT INTO users VALUES (?, ?, ?, ?, ?)",
+                [self._user_row(u) for u in users])
+            self._conn.executemany(
+                "INSERT INTO portfolios VALUES (?, ?, ?)",
+                [self._portfolio_row(p) for p in portfolios])
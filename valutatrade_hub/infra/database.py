@@ -1,6 +1,9 @@
 import json
 import os
 
+from valutatrade_hub.decorators import timed
+
+from .backends import JsonBackend, SqliteBackend, StorageBackend
 from .settings import SettingsLoader
 
 
@@ -11,8 +14,22 @@ class DatabaseManager:
         if cls._instance is None:
             cls._instance = super(DatabaseManager, cls).__new__(cls)
             cls._instance._settings = SettingsLoader()
+            cls._instance._backend = cls._instance._create_backend()
         return cls._instance
 
+    def _create_backend(self) -> StorageBackend:
+        kind = self._settings.get("STORAGE_BACKEND", "json").lower()
+        if kind == "sqlite":
+            return SqliteBackend(self._settings.get("SQLITE_FILE"))
+        if kind == "json":
+            return JsonBackend(self, self._settings)
+        raise ValueError(f"Неизвестный STORAGE_BACKEND '{kind}'")
+
+    @property
+    def backend(self) -> StorageBackend:
+        return self._backend
+
+    @timed("db_read_json")
     def _read_json(self, filepath: str, default=None):
         if not os.path.exists(filepath):
             return default if default is not None else []
@@ -22,6 +39,7 @@ class DatabaseManager:
         except (json.JSONDecodeError, IOError):
             return default if default is not None else []
 
+    @timed("db_write_json")
     def _write_json(self, filepath: str, data):
         # Атомарная запись
         temp_file = filepath + ".tmp"
@@ -29,18 +47,47 @@ class DatabaseManager:
             json.dump(data, f, indent=4, ensure_ascii=False)
         os.replace(temp_file, filepath)
 
-    # Методы для конкретных сущностей
+    # Методы для конкретных сущностей (делегируются бэкенду)
     def load_users(self):
-        return self._read_json(self._settings.get("USERS_FILE"), [])
+        return self._backend.load_users()
 
     def save_users(self, data):
-        self._write_json(self._settings.get("USERS_FILE"), data)
+        self._backend.save_users(data)
 
     def load_portfolios(self):
-        return self._read_json(self._settings.get("PORTFOLIOS_FILE"), [])
+        return self._backend.load_portfolios()
 
     def save_portfolios(self, data):
-        self._write_json(self._settings.get("PORTFOLIOS_FILE"), data)
+        self._backend.save_portfolios(data)
+
+    def get_user(self, username: str):
+        return self._backend.get_user(username)
+
+    def get_user_by_id(self, user_id: int):
+        return self._backend.get_user_by_id(user_id)
+
+    def add_user(self, record: dict) -> int:
+        return self._backend.add_user(record)
+
+    def next_user_id(self) -> int:
+        return self._backend.next_user_id()
+
+    def get_portfolio(self, user_id: int):
+        return self._backend.get_portfolio(user_id)
+
+    def save_portfolio(self, record: dict, expected_version: int = None,
+                       before_write=None, rebase=None) -> int:
+        return self._backend.save_portfolio(record, expected_version,
+                                            before_write, rebase)
+
+    def migrate_json_to_sqlite(self):
+        """Разовый импорт users.json / portfolios.json в SQLite"""
+        source = JsonBackend(self, self._settings)
+        users = source.load_users()
+        portfolios = source.load_portfolios()
+        target = SqliteBackend(self._settings.get("SQLITE_FILE"))
+        target.import_records(users, portfolios)
+        return len(users), len(portfolios)
 
     def load_rates(self):
         return self._read_json(self._settings.get("RATES_FILE"), {})
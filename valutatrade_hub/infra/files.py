@@ -0,0 +1,16 @@
+import os
+from typing import Optional, Tuple
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Отпечаток файла для проверки "изменился ли": (inode, mtime_ns, size)
+    или None, если файла нет. Файлы пишутся через os.replace, поэтому новый
+    файл — новый inode, даже если mtime в пределах гранулярности ФС и
+    размер совпали.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
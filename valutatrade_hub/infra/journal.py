@@ -0,0 +1,249 @@
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Tuple
+
+from valutatrade_hub.core.exceptions import ConcurrentModificationError
+
+from .database import DatabaseManager
+from .locks import file_lock
+from .settings import SettingsLoader
+
+logger = logging.getLogger("ValutaTrade")
+
+
+class TradeJournal:
+    """
+    Журнал сделок с упреждающей записью (Singleton).
+
+    Каждая сделка сначала дописывается в trades.wal (JSONL) и сбрасывается
+    на диск, и только потом сохраняется портфель. Запись делается под
+    блокировкой портфеля после проверки его версии (before_write в
+    save_portfolio), поэтому записи проигравших гонку в журнал не попадают.
+    Запись журнала — итоговое состояние портфеля с целевой версией, поэтому
+    повтор идемпотентен: применяется, только если в хранилище версия ровно
+    на 1 меньше. Рядом с состоянием запись хранит детали сделки (валюта,
+    сумма, курс, стоимость). Если портфель после записи журнала сохранить
+    не удалось, сделка помечается записью ABORT, и повтор ее пропускает.
+
+    Group commit: потоки, пришедшие во время fsync, копят свои записи,
+    и следующий лидер пишет их одним write + одним fsync.
+
+    Контрольная точка (checkpoint) под эксклюзивной блокировкой journal.lock
+    доигрывает хвост, сбрасывает хранилище на диск и обнуляет журнал;
+    сделки держат ту же блокировку в разделяемом режиме.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TradeJournal, cls).__new__(cls)
+            cls._instance._init()
+            cls._instance.recover()
+        return cls._instance
+
+    def _init(self):
+        self._settings = SettingsLoader()
+        self._db = DatabaseManager()
+        folder = self._settings.get("JOURNAL_DIR")
+        os.makedirs(folder, exist_ok=True)
+        self._path = os.path.join(folder, "trades.wal")
+        self._lock_path = os.path.join(folder, "journal.lock")
+        self._checkpoint_path = os.path.join(folder, "checkpoint.json")
+        self._fsync = self._settings.get("JOURNAL_FSYNC", True)
+        self._commit_delay = self._settings.get("JOURNAL_COMMIT_DELAY", 0.0)
+        self._checkpoint_bytes = self._settings.get("JOURNAL_CHECKPOINT_BYTES")
+        self._fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                           0o644)
+        self._ids = itertools.count(1)
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._open_batch = 0   # пакет, в который попадают новые записи
+        self._durable = -1     # последний пакет, дошедший до диска
+        self._flushing = False
+        self._failed = None    # (пакет, исключение)
+        self.appended = 0
+        self.flushes = 0
+
+    @contextmanager
+    def transaction(self):
+        """Сделка: запись в журнал + сохранение портфеля"""
+        with file_lock(self._lock_path, shared=True):
+            yield
+        # Сделка уже сохранена: сбой контрольной точки не должен выдать ее
+        # за неудачную. Журнал просто останется длиннее до следующей точки
+        try:
+            size = os.fstat(self._fd).st_size
+            if self._checkpoint_bytes and size >= self._checkpoint_bytes:
+                self.checkpoint(blocking=False)
+        except Exception as e:
+            logger.error(f"JOURNAL checkpoint failed: {e}")
+
+    def append(self, op: str, record: dict, details: dict = None) -> str:
+        """
+        Дописывает состояние портфеля после сделки (record — Portfolio.to_dict()
+        с уже увеличенной version) и детали сделки (details: currency, amount,
+        rate, value или legs для пакета). Возвращает id записи, когда она
+        на диске.
+        """
+        entry_id = f"{os.getpid()}-{next(self._ids)}"
+        entry = {"id": entry_id,
+                 "ts": datetime.now(timezone.utc).isoformat(),
+                 "op": op, **(details or {}), **record}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+
+        with self._cond:
+            batch = self._open_batch
+            self._pending.append(line)
+            self.appended += 1
+            while self._durable < batch:
+                if not self._flushing:
+                    self._flushing = True
+                    break
+                self._cond.wait()
+            else:
+                if self._failed and self._failed[0] == batch:
+                    raise self._failed[1]
+                return entry_id
+
+        # Лидер пакета
+        if self._commit_delay:
+            time.sleep(self._commit_delay)  # даем пакету набраться
+        with self._cond:
+            lines, self._pending = self._pending, []
+            batch = self._open_batch
+            self._open_batch += 1
+
+        error = None
+        try:
+            data = memoryview("".join(lines).encode("utf-8"))
+            while data:
+                data = data[os.write(self._fd, data):]
+            if self._fsync:
+                os.fsync(self._fd)
+        except OSError as e:
+            error = e
+
+        with self._cond:
+            self._flushing = False
+            self._durable = batch
+            self.flushes += 1
+            if error:
+                self._failed = (batch, error)
+            self._cond.notify_all()
+        if error:
+            raise error
+        return entry_id
+
+    def abort(self, entry_id: str, user_id: int):
+        """
+        Помечает запись entry_id отмененной: портфель после нее сохранить не
+        удалось, и повтор не должен применять сделку, о которой сообщили как
+        о неудачной. Вызывается внутри transaction(), пока контрольная точка
+        не может доиграть запись.
+        """
+        self.append("ABORT", {"aborted": entry_id, "user_id": user_id})
+
+    def entries(self, start: int = 0) -> Iterator[Tuple[int, dict]]:
+        """(смещение конца строки, запись) для полных строк начиная с start"""
+        with open(self._path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # строку еще дописывают
+                offset += len(line)
+                try:
+                    yield offset, json.loads(line)
+                except json.JSONDecodeError:
+                    # Оборванная запись упавшего процесса: fsync не
+                    # завершился, сделка не была подтверждена
+                    continue
+
+    def replay(self, start: int = 0) -> Tuple[int, int]:
+        """
+        Доигрывает записи, не дошедшие до хранилища, и возвращает (число
+        доигранных, до какого смещения просмотрен журнал). Записи одного
+        портфеля идут в журнале по порядку версий, а каждая следующая
+        пишется уже после сохранения предыдущей, поэтому недоигранной может
+        быть только последняя. Отмененную (ABORT) последнюю запись
+        пропускает: предыдущая к ней уже сохранена.
+        """
+        latest = {}
+        end = start
+        for end, entry in self.entries(start):
+            if entry["op"] == "ABORT":
+                current = latest.get(entry["user_id"])
+                if current and current["id"] == entry["aborted"]:
+                    del latest[entry["user_id"]]
+                continue
+            latest[entry["user_id"]] = entry
+        applied = 0
+        for entry in latest.values():
+            stored = self._db.get_portfolio(entry["user_id"])
+            version = stored.get("version", 0) if stored else 0
+            if version != entry["version"] - 1:
+                continue
+            try:
+                self._db.save_portfolio({"user_id": entry["user_id"],
+                                         "wallets": entry["wallets"]},
+                                        expected_version=version)
+            except ConcurrentModificationError:
+                continue  # сделку только что сохранил ее собственный процесс
+            applied += 1
+        return applied, end
+
+    def checkpoint(self, blocking: bool = True) -> Optional[int]:
+        """
+        Доигрывает журнал, сбрасывает хранилище на диск и обнуляет журнал.
+        Возвращает число доигранных записей или None, если журнал занят
+        (blocking=False), — тогда точку сделает следующий процесс.
+        """
+        with file_lock(self._lock_path, blocking=blocking) as acquired:
+            if not acquired:
+                return None
+            applied, _ = self.replay()
+            if hasattr(os, "sync"):
+                os.sync()  # записи хранилища не fsync-ятся по отдельности
+            os.truncate(self._path, 0)
+            self._db._write_json(self._checkpoint_path, {
+                "at": datetime.now(timezone.utc).isoformat(),
+                "replayed": applied
+            })
+        if applied:
+            logger.warning(f"JOURNAL replayed={applied}")
+        return applied
+
+    def recover(self) -> int:
+        """
+        При старте: доиграть сделки, прерванные падением процесса. Журнал не
+        обнуляется и os.sync() не вызывается — это делает контрольная точка
+        по JOURNAL_CHECKPOINT_BYTES, а не каждый запуск CLI.
+
+        Просмотренная часть журнала запоминается в checkpoint.json
+        (recovered_offset): запись еще идущей сделки replay не пропустит, а
+        дождется блокировки ее портфеля, так что до этого смещения журнал
+        разобран, и следующий запуск читает только новый хвост.
+        """
+        if os.path.getsize(self._path) == 0:
+            return 0
+        with file_lock(self._lock_path, shared=True):
+            state = self._db._read_json(self._checkpoint_path, {})
+            start = state.get("recovered_offset", 0)
+            if start >= os.path.getsize(self._path):
+                return 0
+            applied, end = self.replay(start)
+            try:
+                self._db._write_json(self._checkpoint_path,
+                                     dict(state, recovered_offset=end))
+            except OSError:
+                pass  # параллельный запуск пишет то же; прочитаем больше
+        if applied:
+            logger.warning(f"JOURNAL recovered={applied}")
+        return applied
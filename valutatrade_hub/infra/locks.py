@@ -0,0 +1,52 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _local_lock(path: str) -> threading.Lock:
+    with _local_locks_guard:
+        return _local_locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False, blocking: bool = True):
+    """
+    Межпроцессная блокировка (flock на файле-замке). Держать ее нужно
+    только на время чтения-проверки-записи.
+    shared — разделяемая блокировка (несколько читателей/писателей журнала);
+    blocking=False — не ждать: в with попадает False, если замок занят.
+    """
+    if fcntl is None:
+        # Без flock и разделяемый режим сводится к локальному мьютексу
+        lock = _local_lock(path)
+        acquired = lock.acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+        return
+
+    # flock различает открытия файла, поэтому потоки одного процесса
+    # блокируют друг друга так же, как разные процессы
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, flags)
+            acquired = True
+        except BlockingIOError:
+            acquired = False
+        yield acquired
+    finally:
+        os.close(fd)  # закрытие снимает flock
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from .database import DatabaseManager
+from .files import file_stamp
+from .settings import SettingsLoader
+
+
+class RatesCache:
+    """
+    Горячий кэш rates.json в памяти процесса (Singleton).
+    Файл перечитывается, только если изменились его mtime/size
+    или истек RATES_TTL с момента последней загрузки.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RatesCache, cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self._settings = SettingsLoader()
+        self._db = DatabaseManager()
+        self._lock = threading.Lock()
+        self._data = {}
+        self._pairs = {}
+        self._stamp = None
+        self._loaded_at = 0.0
+        self._validated = {}
+        self._validated_stamp = None
+        self.hits = 0
+        self.misses = 0
+
+    def _is_valid(self, stamp) -> bool:
+        if self._stamp is None or stamp != self._stamp:
+            return False
+        ttl = self._settings.get("RATES_TTL")
+        return (time.monotonic() - self._loaded_at) < ttl
+
+    def _reload(self, stamp):
+        self._data = self._db.load_rates()
+        self._pairs = self._data.get("pairs", self._data)
+        self._stamp = stamp
+        self._loaded_at = time.monotonic()
+
+    def get_data(self) -> dict:
+        """Весь снимок rates.json (только для чтения)"""
+        self.get_pairs()
+        return self._data
+
+    def get_pairs(self) -> dict:
+        """Словарь пар {'BTC_USD': {...}} (только для чтения)"""
+        stamp = file_stamp(self._settings.get("RATES_FILE"))
+        with self._lock:
+            if self._is_valid(stamp):
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._reload(stamp)
+            return self._pairs
+
+    def get_validated(self) -> dict:
+        """{источник: время последнего 304} из rates_validated.json"""
+        path = self._settings.get("RATES_VALIDATED_FILE")
+        stamp = file_stamp(path)
+        with self._lock:
+            if stamp != self._validated_stamp:
+                self._validated = self._db._read_json(path, {}) if stamp else {}
+                self._validated_stamp = stamp
+            return self._validated
+
+    def invalidate(self):
+        with self._lock:
+            self._stamp = None
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses,
+                "pairs": len(self._pairs)}
@@ -20,19 +20,54 @@ class SettingsLoader:
 
         # Создаем папки, если их нет
         os.makedirs(data_dir, exist_ok=True)
-        os.makedirs(logs_dir, exist_ok=True)
+        # logs/ создает logging_config при первой записи в лог
 
         self._config = {
             "DATA_DIR": data_dir,
             "LOGS_DIR": logs_dir,
             "USERS_FILE": os.path.join(data_dir, "users.json"),
             "PORTFOLIOS_FILE": os.path.join(data_dir, "portfolios.json"),
+            "PORTFOLIOS_DIR": os.path.join(data_dir, "portfolios"),
             "RATES_FILE": os.path.join(data_dir, "rates.json"),
+            "RATES_VALIDATED_FILE": os.path.join(data_dir, "rates_validated.json"),
+            # json (по умолчанию) или sqlite
+            "STORAGE_BACKEND": os.getenv("VALUTATRADE_STORAGE", "json"),
+            "SQLITE_FILE": os.path.join(data_dir, "valutatrade.db"),
+            "REPORTS_DIR": os.path.join(data_dir, "reports"),
+            "JOURNAL_DIR": os.path.join(data_dir, "journal"),
+            # project serve: Unix-сокет (или TCP-порт там, где нет AF_UNIX)
+            "SERVICE_SOCKET": os.path.join(data_dir, "valutatrade.sock"),
+            "SERVICE_PORT": 8765,
+            "SERVICE_WORKERS": 8,
             "LOG_FILE": os.path.join(logs_dir, "actions.log"),
             "RATES_TTL": 300,  # 5 минут свежести данных
+            "RATES_AUTO_REFRESH": True,  # фоновое обновление устаревших курсов
+            "RATES_REFRESH_COOLDOWN": 60,  # не чаще раза в минуту
+            # повторы сделки при конкурентном изменении портфеля
+            "TRADE_MAX_RETRIES": 5,
+            # Пауза перед повтором: случайная, до min(база * 2^попытка, max), сек
+            "TRADE_RETRY_BACKOFF": 0.002,
+            "TRADE_RETRY_BACKOFF_MAX": 0.1,
+            "JOURNAL_FSYNC": True,  # сделка подтверждается после fsync журнала
+            "JOURNAL_COMMIT_DELAY": 0.0,  # сек ожидания пакета (group commit)
+            "JOURNAL_CHECKPOINT_BYTES": 4 * 1024 * 1024,
             "BASE_CURRENCY": "USD",
+            "METRICS_ENABLED": True,
+            # Prometheus text format; перезаписывается при выходе и по stats
+            "METRICS_FILE": os.path.join(logs_dir, "metrics.prom"),
+            # profile <команда> и --profile: файлы в LOGS_DIR/profiles
+            "PROFILE_TOP": 15,
+            "PROFILE_SAMPLE_INTERVAL": 0.001,  # сек между снимками стека
             "LOG_LEVEL": "INFO",
-            "LOG_FORMAT": "%(asctime)s %(levelname)s %(message)s"
+            "LOG_JSON": True,  # JSON-строки; False — текст по LOG_FORMAT
+            "LOG_FORMAT": "%(asctime)s %(levelname)s %(message)s",
+            # Ротация: "size" (LOG_MAX_BYTES) или "time" (LOG_ROTATE_WHEN)
+            "LOG_ROTATION": "size",
+            "LOG_MAX_BYTES": 10 * 1024 * 1024,
+            "LOG_ROTATE_WHEN": "midnight",
+            "LOG_ROTATE_INTERVAL": 1,
+            "LOG_BACKUP_COUNT": 30,
+            "LOG_BATCH_SIZE": 256,  # записей на один сброс файла
         }
 
     def get(self, key: str, default: Any = None) -> Any:
@@ -0,0 +1,107 @@
+import json
+import logging
+import logging.handlers
+import os
+from datetime import datetime, timezone
+
+# Поля, которые log_action и сделки передают через extra=
+RECORD_FIELDS = ("action", "user", "currency", "amount", "rate", "value",
+                 "latency_ms", "result", "error", "batch")
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна JSON-строка: время, уровень, текст и поля сделки"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        for field in RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _BatchFlushMixin:
+    """flush() после каждой записи пропускается, файл сбрасывает listener"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        logging.StreamHandler.flush(self)
+
+
+class SizeRotatingHandler(_BatchFlushMixin, logging.handlers.RotatingFileHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._size = os.path.getsize(self.baseFilename)
+
+    def shouldRollover(self, record):
+        # Размер считаем сами: штатная проверка делает seek() и
+        # сбрасывает буфер файла на каждой записи
+        if self.maxBytes <= 0:
+            return False
+        size = len((self.format(record) + self.terminator).encode('utf-8'))
+        if self._size and self._size + size >= self.maxBytes:
+            self._size = size  # запись уйдет уже в новый файл
+            return True
+        self._size += size
+        return False
+
+
+class TimeRotatingHandler(_BatchFlushMixin,
+                          logging.handlers.TimedRotatingFileHandler):
+    pass
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """
+    Пишет записи из очереди в файл и сбрасывает его один раз на пачку:
+    когда очередь опустела или набралось batch_size записей.
+    """
+
+    def __init__(self, queue, handler, batch_size: int):
+        super().__init__(queue, handler, respect_handler_level=True)
+        self.batch_size = batch_size
+        self._unflushed = 0
+
+    def handle(self, record):
+        super().handle(record)
+        self._unflushed += 1
+        if self._unflushed >= self.batch_size or self.queue.empty():
+            self._flush()
+
+    def _flush(self):
+        for handler in self.handlers:
+            handler.flush_batch()
+        self._unflushed = 0
+
+    def stop(self):
+        if self._thread is None:  # уже остановлен
+            return
+        super().stop()  # дожидается записи всего, что уже в очереди
+        self._flush()
+
+
+def file_handler(settings) -> logging.Handler:
+    """Файловый обработчик с ротацией по размеру или по времени"""
+    log_file = settings.get("LOG_FILE")
+    backups = settings.get("LOG_BACKUP_COUNT")
+    if settings.get("LOG_ROTATION") == "time":
+        handler = TimeRotatingHandler(
+            log_file, when=settings.get("LOG_ROTATE_WHEN"),
+            interval=settings.get("LOG_ROTATE_INTERVAL"),
+            backupCount=backups, encoding='utf-8', utc=True)
+    else:
+        handler = SizeRotatingHandler(
+            log_file, maxBytes=settings.get("LOG_MAX_BYTES"),
+            backupCount=backups, encoding='utf-8')
+    if settings.get("LOG_JSON"):
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(settings.get("LOG_FORMAT")))
+    return handler
@@ -1,24 +1,88 @@
 import logging
-import logging.handlers
+import os
+import sys
+import threading
 
 from valutatrade_hub.infra.settings import SettingsLoader
 
+LOGGER_NAME = "ValutaTrade"
+
+_setup_lock = threading.Lock()
+_configured = False
+_listener = None
+
 
 def setup_logging():
+    """
+    Логгер пишет в очередь (QueueHandler) и не ждет диска; файл с ротацией
+    пишет отдельный поток (QueueListener) пачками.
+    """
+    # logging.handlers тянет socket, pickle и queue — только когда пишем в лог
+    import atexit
+    import logging.handlers
+    import queue
+
+    from valutatrade_hub.log_handlers import BatchingQueueListener, file_handler
+
+    global _listener
     settings = SettingsLoader()
-    log_file = settings.get("LOG_FILE")
-    log_format = settings.get("LOG_FORMAT")
+    os.makedirs(os.path.dirname(settings.get("LOG_FILE")), exist_ok=True)
 
-    # Ротация: макс 1 МБ, храним 3 файла бэкапа
-    handler = logging.handlers.RotatingFileHandler(
-        log_file, maxBytes=1_000_000, backupCount=3, encoding='utf-8'
-    )
-    handler.setFormatter(logging.Formatter(log_format))
+    log_queue = queue.SimpleQueue()  # без ограничения: put не блокирует
+    _listener = BatchingQueueListener(log_queue, file_handler(settings),
+                                      settings.get("LOG_BATCH_SIZE"))
+    _listener.start()
+    atexit.register(_listener.stop)
+    mp_util = sys.modules.get("multiprocessing.util")
+    if mp_util:
+        # Дочерние процессы multiprocessing выходят через os._exit, минуя atexit
+        mp_util.Finalize(None, _listener.stop, exitpriority=10)
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(settings.get("LOG_LEVEL", "INFO"))
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    return logger
 
-    logger = logging.getLogger("ValutaTrade")
-    logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
 
+def ensure_logging() -> logging.Logger:
+    """Настраивает логгер при первом обращении (повторные вызовы дешевы)"""
+    global _configured
+    if not _configured:
+        with _setup_lock:
+            if not _configured:
+                logger.removeFilter(_setup_filter)
+                setup_logging()
+                _configured = True
     return logger
 
-logger = setup_logging()
\ No newline at end of file
+
+class _SetupOnFirstRecord(logging.Filter):
+    """
+    Фильтр логгера срабатывает до обработчиков, поэтому первая же запись
+    (из любого модуля, взявшего logging.getLogger("ValutaTrade")) успевает
+    попасть в файл, а запуски без записей в лог файл не создают вовсе.
+    """
+
+    def filter(self, record):
+        ensure_logging()
+        return True
+
+
+def _reset_after_fork():
+    # Поток-писатель в дочерний процесс не переходит: настроимся заново
+    global _configured, _listener
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    _configured = False
+    _listener = None
+    if _setup_filter not in logger.filters:
+        logger.addFilter(_setup_filter)
+
+
+logger = logging.getLogger(LOGGER_NAME)
+logger.setLevel(logging.INFO)
+_setup_filter = _SetupOnFirstRecord()
+logger.addFilter(_setup_filter)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,180 @@
+import bisect
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from valutatrade_hub.infra.settings import SettingsLoader
+
+PREFIX = "valutatrade_"
+
+# Границы корзин гистограмм длительности, секунды (как у клиентов Prometheus,
+# но с запасом снизу: операции в памяти занимают десятки микросекунд)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: O(log корзин) на наблюдение"""
+    __slots__ = ("buckets", "counts", "sum", "count", "max", "_lock")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя — +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        with self._lock:
+            counts, total, peak = list(self.counts), self.count, self.max
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else peak
+                return min(lower + (upper - lower) * (rank - seen) / n, peak)
+            seen += n
+        return peak
+
+
+class MetricsRegistry:
+    """
+    Счетчики и гистограммы процесса (Singleton). При METRICS_ENABLED=False
+    декораторы сразу вызывают функцию, не трогая реестр.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetricsRegistry, cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self._settings = SettingsLoader()
+        self.enabled = self._settings.get("METRICS_ENABLED", True)
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], Counter] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        if self.enabled and self._settings.get("METRICS_FILE"):
+            import atexit
+            atexit.register(self._export_on_exit)
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> Tuple[str, Labels]:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def counter(self, name: str, **labels) -> Counter:
+        key = self._key(name, labels)
+        with self._lock:
+            return self._counters.setdefault(key, Counter())
+
+    def histogram(self, name: str, buckets=DEFAULT_BUCKETS, **labels) -> Histogram:
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(buckets)
+            return self._histograms[key]
+
+    def summary(self) -> List[dict]:
+        """Сводка по гистограммам *_seconds с их счетчиками *_errors_total"""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = dict(self._counters)
+        rows = []
+        for (name, labels), hist in histograms:
+            base = name[:-len("_seconds")] if name.endswith("_seconds") else name
+            errors = counters.get((f"{base}_errors_total", labels))
+            rows.append({
+                "name": base,
+                "labels": dict(labels),
+                "count": hist.count,
+                "errors": errors.value if errors else 0,
+                "avg_ms": hist.sum / hist.count * 1000 if hist.count else 0.0,
+                "p50_ms": hist.quantile(0.50) * 1000,
+                "p95_ms": hist.quantile(0.95) * 1000,
+                "p99_ms": hist.quantile(0.99) * 1000,
+                "max_ms": hist.max * 1000,
+            })
+        return rows
+
+    @staticmethod
+    def _labels_text(labels: Labels, extra: Tuple = ()) -> str:
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def to_prometheus(self) -> str:
+        """Текстовый формат экспозиции Prometheus (0.0.4)"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        lines, typed = [], set()
+        for (name, labels), counter in counters:
+            metric = PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{self._labels_text(labels)} {counter.value}")
+        for (name, labels), hist in histograms:
+            metric = PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            with hist._lock:
+                counts, total, count = list(hist.counts), hist.sum, hist.count
+            cumulative = 0
+            for bound, n in zip(list(hist.buckets) + ["+Inf"], counts):
+                cumulative += n
+                le = self._labels_text(labels, (("le", bound),))
+                lines.append(f"{metric}_bucket{le} {cumulative}")
+            lines.append(f"{metric}_sum{self._labels_text(labels)} {total}")
+            lines.append(f"{metric}_count{self._labels_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str = None) -> str:
+        """Атомарно пишет метрики в файл (для textfile-коллектора)"""
+        path = path or self._settings.get("METRICS_FILE")
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_file = path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_file, path)
+        return path
+
+    def _export_on_exit(self):
+        with self._lock:
+            recorded = any(h.count for h in self._histograms.values())
+        if recorded:
+            self.export()
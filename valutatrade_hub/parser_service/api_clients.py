@@ -1,23 +1,198 @@
+import hashlib
+import json
+import os
+import random
+import threading
 import time
 from abc import ABC, abstractmethod
 from datetime import datetime, timezone
-from typing import Any, Dict, List
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from valutatrade_hub.core.exceptions import ApiRequestError
+from valutatrade_hub.decorators import timed
 
 from .config import ParserConfig
+from .rate_limiter import TokenBucket
+
+# Статусы, на которых имеет смысл повторить запрос
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session(config: ParserConfig) -> requests.Session:
+    """Общая для всех клиентов сессия с пулом keep-alive соединений"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_SIZE,
+                                  pool_maxsize=config.HTTP_POOL_SIZE,
+                                  max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After: число секунд или HTTP-дата"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class ResponseCache:
+    """
+    Валидаторы (ETag / Last-Modified) и последний декодированный ответ
+    источника на диске — для условных запросов.
+    """
+
+    def __init__(self, cache_dir: str, source_name: str):
+        safe_name = "".join(c if c.isalnum() else "_" for c in source_name.lower())
+        self.path = os.path.join(cache_dir, f"{safe_name}.json")
+
+    @staticmethod
+    def make_key(url: str, params: dict = None) -> str:
+        # Хешируем: в URL может быть API-ключ
+        full = url + "?" + urlencode(sorted((params or {}).items()))
+        return hashlib.sha256(full.encode()).hexdigest()
+
+    def load(self, key: str) -> Optional[dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return entry if entry.get("key") == key else None
+
+    def save(self, key: str, etag: Optional[str],
+             last_modified: Optional[str], payload):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_file = self.path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({"key": key, "etag": etag, "last_modified": last_modified,
+                       "payload": payload}, f, ensure_ascii=False)
+        os.replace(temp_file, self.path)
 
 
 class BaseApiClient(ABC):
+    SOURCE_NAME = ""
+
     def __init__(self, config: ParserConfig):
         self.config = config
+        self.limiter = None
+        limit = config.RATE_LIMITS.get(self.SOURCE_NAME)
+        if limit:
+            capacity, per_minute = limit
+            self.limiter = TokenBucket(self.SOURCE_NAME, capacity, per_minute,
+                                       config.RATE_LIMIT_DIR,
+                                       config.RATE_LIMIT_MAX_WAIT)
+        self.cache = ResponseCache(config.HTTP_CACHE_DIR, self.SOURCE_NAME)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: случайная пауза в [0, base * 2^attempt]"""
+        cap = min(self.config.RETRY_BACKOFF_MAX,
+                  self.config.RETRY_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def _get(self, url: str, params: dict = None, headers: dict = None,
+             deadline: float = None) -> Tuple[requests.Response, dict]:
+        """
+        GET через общий пул с ограниченным числом повторов.
+        deadline (time.monotonic()) ограничивает таймаут каждой попытки и
+        паузы между ними: повтор, который к нему не успеет, не делается.
+        Возвращает ответ и meta: request_ms (последняя попытка) и attempts.
+        """
+        session = get_session(self.config)
+        last_attempt = self.config.MAX_RETRIES
+        for attempt in range(last_attempt + 1):
+            if self.limiter:
+                # Повторы тоже расходуют бюджет источника
+                self.limiter.acquire(deadline=deadline)
+            timeout = self.config.REQUEST_TIMEOUT
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise requests.Timeout(f"deadline exceeded for {url}")
+                timeout = min(timeout, remaining)
+            start_time = time.perf_counter()
+            try:
+                response = session.get(url, params=params, headers=headers,
+                                       timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == last_attempt:
+                    raise
+                delay = self._backoff(attempt)
+                response = None
+            else:
+                request_ms = int((time.perf_counter() - start_time) * 1000)
+                meta = {"request_ms": request_ms, "attempts": attempt + 1}
+                if (response.status_code not in RETRY_STATUSES
+                        or attempt == last_attempt):
+                    return response, meta
+                delay = parse_retry_after(response.headers.get("Retry-After"))
+                if delay is None:
+                    delay = self._backoff(attempt)
+            delay = min(delay, self.config.RETRY_BACKOFF_MAX)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                # До дедлайна повтор не успеет: отдаем то, что есть
+                if response is None:
+                    raise requests.Timeout(f"deadline exceeded for {url}")
+                return response, meta
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+    def _get_json(self, url: str, params: dict = None,
+                  deadline: float = None) -> Tuple[Any, dict]:
+        """
+        Условный GET: при 304 возвращает сохраненный payload
+        и meta['not_modified'] = True.
+        """
+        key = self.cache.make_key(url, params)
+        cached = self.cache.load(key)
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response, meta = self._get(url, params=params, headers=headers,
+                                   deadline=deadline)
+        meta["status_code"] = response.status_code
+        if response.status_code == 304 and cached:
+            meta["not_modified"] = True
+            return cached["payload"], meta
+
+        response.raise_for_status()
+        data = response.json()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self.cache.save(key, etag, last_modified, data)
+        return data, meta
 
     @abstractmethod
-    def fetch_rates(self) -> List[Dict[str, Any]]:
+    def fetch_rates(self, deadline: float = None) -> List[Dict[str, Any]]:
         """
-        Возвращает список словарей формата:
+        deadline — момент по time.monotonic(), после которого источник
+        прекращает повторы. Возвращает список словарей формата:
         {
             "pair": "BTC_USD",
             "rate": 50000.0,
@@ -30,7 +205,10 @@ class BaseApiClient(ABC):
 
 
 class CoinGeckoClient(BaseApiClient):
-    def fetch_rates(self) -> List[Dict[str, Any]]:
+    SOURCE_NAME = "CoinGecko"
+
+    @timed("fetch_rates", source="CoinGecko")
+    def fetch_rates(self, deadline: float = None) -> List[Dict[str, Any]]:
         # Формируем список ID: bitcoin,ethereum...
         ids = list(self.config.CRYPTO_ID_MAP.values())
         ids_str = ",".join(ids)
@@ -42,19 +220,13 @@ class CoinGeckoClient(BaseApiClient):
         # bitcoin -> BTC (чтобы восстановить тикер)
         id_to_ticker = {v: k for k, v in self.config.CRYPTO_ID_MAP.items()}
 
-        start_time = time.time()
         try:
-            response = requests.get(
-                self.config.COINGECKO_URL,
-                params=params,
-                timeout=self.config.REQUEST_TIMEOUT
-            )
-            response.raise_for_status()
-            data = response.json()
+            data, request_meta = self._get_json(self.config.COINGECKO_URL,
+                                                params=params,
+                                                deadline=deadline)
         except requests.RequestException as e:
             raise ApiRequestError(f"CoinGecko Error: {e}")
 
-        duration = int((time.time() - start_time) * 1000)
         results = []
         now_iso = datetime.now(timezone.utc).isoformat()
 
@@ -71,18 +243,20 @@ class CoinGeckoClient(BaseApiClient):
                     "to_currency": self.config.BASE_CURRENCY,
                     "rate": float(price),
                     "timestamp": now_iso,
-                    "source": "CoinGecko",
+                    "source": self.SOURCE_NAME,
                     "meta": {
                         "raw_id": coin_id,
-                        "request_ms": duration,
-                        "status_code": response.status_code
+                        **request_meta
                     }
                 })
         return results
 
 
 class ExchangeRateApiClient(BaseApiClient):
-    def fetch_rates(self) -> List[Dict[str, Any]]:
+    SOURCE_NAME = "ExchangeRate-API"
+
+    @timed("fetch_rates", source="ExchangeRate-API")
+    def fetch_rates(self, deadline: float = None) -> List[Dict[str, Any]]:
         api_key = self.config.EXCHANGERATE_API_KEY
         if not api_key:
             raise ApiRequestError("ExchangeRate API Key not found in env vars")
@@ -90,18 +264,14 @@ class ExchangeRateApiClient(BaseApiClient):
         base = self.config.BASE_CURRENCY
         url = f"{self.config.EXCHANGERATE_API_URL}/{api_key}/latest/{base}"
 
-        start_time = time.time()
         try:
-            response = requests.get(url, timeout=self.config.REQUEST_TIMEOUT)
-            response.raise_for_status()
-            data = response.json()
+            data, request_meta = self._get_json(url, deadline=deadline)
         except requests.RequestException as e:
             raise ApiRequestError(f"ExchangeRate-API Error: {e}")
 
         if data.get("result") != "success":
             raise ApiRequestError(f"API Error: {data.get('error-type')}")
 
-        duration = int((time.time() - start_time) * 1000)
         results = []
         now_iso = datetime.now(timezone.utc).isoformat()
 
@@ -122,10 +292,7 @@ class ExchangeRateApiClient(BaseApiClient):
                     "to_currency": base,
                     "rate": usd_price,
                     "timestamp": now_iso,
-                    "source": "ExchangeRate-API",
-                    "meta": {
-                        "request_ms": duration,
-                        "status_code": response.status_code
-                    }
+                    "source": self.SOURCE_NAME,
+                    "meta": dict(request_meta)
                 })
         return results
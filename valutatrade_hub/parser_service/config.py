@@ -11,6 +11,24 @@ class ParserConfig:
 
     BASE_CURRENCY: str = "USD"
     REQUEST_TIMEOUT: int = 15
+    # Источники опрашиваются параллельно: дедлайн на источник и на весь цикл
+    SOURCE_DEADLINE: float = 20.0
+    UPDATE_DEADLINE: float = 30.0
+
+    # Пул HTTP-соединений и повторы на 429/5xx (экспоненциально, с джиттером)
+    HTTP_POOL_SIZE: int = 10
+    MAX_RETRIES: int = 3
+    RETRY_BACKOFF_BASE: float = 0.5
+    RETRY_BACKOFF_MAX: float = 8.0
+
+    # Клиентский лимит запросов: (емкость бакета, запросов в минуту).
+    # Состояние общее для всех процессов (файлы в RATE_LIMIT_DIR)
+    RATE_LIMITS = {
+        "CoinGecko": (5, 10),
+        "ExchangeRate-API": (5, 30),
+    }
+    RATE_LIMIT_MAX_WAIT: float = 5.0  # дольше ждать токен не будем
+    RATE_LIMIT_DIR: str = os.path.join("data", "ratelimit")
 
     FIAT_CURRENCIES: tuple = ("EUR", "GBP", "RUB", "JPY", "CNY")
     CRYPTO_CURRENCIES: tuple = ("BTC", "ETH", "SOL", "USDT")
@@ -23,4 +41,12 @@ class ParserConfig:
     }
 
     RATES_FILE_PATH: str = os.path.join("data", "rates.json")
+    # Источники, подтвердившие курсы ответом 304 (без перезаписи rates.json)
+    VALIDATED_FILE_PATH: str = os.path.join("data", "rates_validated.json")
+    HTTP_CACHE_DIR: str = os.path.join("data", "http_cache")
+    # Устаревший формат истории (один JSON-массив), см. convert-history
     HISTORY_FILE_PATH: str = os.path.join("data", "exchange_rates.json")
+    HISTORY_DIR: str = os.path.join("data", "history")
+    HISTORY_FSYNC: bool = True
+    HISTORY_COLUMNS_DIR: str = os.path.join("data", "history", "columns")
+    HISTORY_ROLLUPS_DIR: str = os.path.join("data", "history", "rollups")
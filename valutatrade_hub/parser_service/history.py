@@ -0,0 +1,150 @@
+import bisect
+import os
+from array import array
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from valutatrade_hub.infra.locks import file_lock
+
+from .config import ParserConfig
+from .storage import ColumnarHistoryStore
+
+INTERVALS = {
+    "1m": 60_000,
+    "1h": 3_600_000,
+    "1d": 86_400_000,
+}
+
+# Поля бара в файле rollup'а (float64 каждое)
+BAR_FIELDS = ("open_time", "open", "high", "low", "close", "vwap", "ticks")
+
+
+def ms_to_iso(ms: float) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat()
+
+
+class RatesHistory:
+    """
+    Чтение истории курсов: сырые тики за интервал или OHLC-бары 1m/1h/1d.
+    Завершенные бары сохраняются в rollup-файлы (<PAIR>_<interval>.bars),
+    поэтому повторный запрос досчитывает только новые тики.
+
+    Объемов источники не отдают, поэтому vwap считается с единичным весом
+    каждого тика (средний курс за бар).
+    """
+
+    def __init__(self, config: ParserConfig = None):
+        config = config or ParserConfig()
+        self.columns = ColumnarHistoryStore(config.HISTORY_COLUMNS_DIR)
+        self.rollups_dir = config.HISTORY_ROLLUPS_DIR
+
+    @staticmethod
+    def parse_time(value: Optional[str]) -> Optional[int]:
+        return ColumnarHistoryStore.to_ms(value) if value else None
+
+    def ticks(self, pair: str, start: str = None,
+              end: str = None) -> Iterator[tuple]:
+        """Потоково отдает (timestamp ISO, rate)"""
+        ts_view, rate_view = self.columns.query(
+            pair, self.parse_time(start), self.parse_time(end))
+        for i in range(len(ts_view)):
+            yield ms_to_iso(ts_view[i]), rate_view[i]
+
+    @staticmethod
+    def _aggregate(ts_view, rate_view, step: int) -> Iterator[tuple]:
+        """
+        Тики отсортированы, поэтому бакет — непрерывный отрезок: его границу
+        находит bisect, а min/max/sum считаются по срезу целиком.
+        """
+        i, n = 0, len(ts_view)
+        while i < n:
+            bucket = ts_view[i] - ts_view[i] % step
+            j = bisect.bisect_left(ts_view, bucket + step, i, n)
+            rates = rate_view[i:j]
+            yield (float(bucket), rates[0], max(rates), min(rates),
+                   rates[-1], sum(rates) / (j - i), float(j - i))
+            i = j
+
+    def _rollup_path(self, pair: str, interval: str) -> str:
+        return os.path.join(self.rollups_dir, f"{pair.upper()}_{interval}.bars")
+
+    def _load_rollup(self, pair: str, interval: str) -> array:
+        bars = array('d')
+        path = self._rollup_path(pair, interval)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            width = len(BAR_FIELDS) * bars.itemsize
+            bars.frombytes(data[:len(data) - len(data) % width])
+        return bars
+
+    def _complete_bars(self, pair: str, interval: str, bars: array) -> array:
+        """Завершенные бары после последнего бара rollup'а"""
+        step = INTERVALS[interval]
+        width = len(BAR_FIELDS)
+        watermark = int(bars[-width]) + step if bars else None
+        ts_view, rate_view = self.columns.query(pair, watermark, None)
+        fresh = list(self._aggregate(ts_view, rate_view, step))
+        # Последний бакет содержит самый свежий тик и еще может дополниться
+        return array('d', [v for bar in fresh[:-1] for v in bar])
+
+    def _update_rollup(self, pair: str, interval: str) -> array:
+        """Дописывает в rollup бары, которые уже не изменятся"""
+        bars = self._load_rollup(pair, interval)
+        if not self._complete_bars(pair, interval, bars):
+            return bars
+
+        # Параллельный запрос мог уже дописать те же бары: под блокировкой
+        # rollup перечитывается и дописывается только то, что после него
+        os.makedirs(self.rollups_dir, exist_ok=True)
+        path = self._rollup_path(pair, interval)
+        with file_lock(path + ".lock"):
+            bars = self._load_rollup(pair, interval)
+            complete = self._complete_bars(pair, interval, bars)
+            if complete:
+                with open(path, 'ab') as f:
+                    # Обрезок от прерванной записи не должен сдвинуть бары
+                    f.truncate(len(bars) * bars.itemsize)
+                    f.write(complete.tobytes())
+                bars.extend(complete)
+        return bars
+
+    def bars(self, pair: str, interval: str = "1h", start: str = None,
+             end: str = None) -> Iterator[dict]:
+        """
+        Потоково отдает OHLC-бары с open_time в [start, end]. Бары всегда
+        целые: последний бар включает и тики после end — так же, как бары
+        из rollup'а.
+        """
+        if interval not in INTERVALS:
+            raise ValueError(f"Интервал должен быть одним из: "
+                             f"{', '.join(INTERVALS)}")
+        step = INTERVALS[interval]
+        start_ms, end_ms = self.parse_time(start), self.parse_time(end)
+        if start_ms is not None:
+            start_ms -= start_ms % step
+
+        width = len(BAR_FIELDS)
+        bars = self._update_rollup(pair, interval)
+        open_times = memoryview(bars)[::width]
+        lo = 0 if start_ms is None else bisect.bisect_left(open_times, start_ms)
+        hi = (len(open_times) if end_ms is None
+              else bisect.bisect_right(open_times, end_ms))
+        for k in range(lo, hi):
+            yield self._bar_dict(bars[k * width:(k + 1) * width])
+
+        # Хвост (незавершенный бар) — из сырых тиков
+        tail_from = int(open_times[-1]) + step if len(open_times) else None
+        if start_ms is not None:
+            tail_from = max(tail_from or start_ms, start_ms)
+        tail_to = None if end_ms is None else end_ms - end_ms % step + step - 1
+        ts_view, rate_view = self.columns.query(pair, tail_from, tail_to)
+        for bar in self._aggregate(ts_view, rate_view, step):
+            yield self._bar_dict(bar)
+
+    @staticmethod
+    def _bar_dict(bar) -> dict:
+        record = dict(zip(BAR_FIELDS, bar))
+        record["open_time"] = ms_to_iso(record["open_time"])
+        record["ticks"] = int(record["ticks"])
+        return record
@@ -0,0 +1,67 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from valutatrade_hub.core.exceptions import RateLimitExceededError
+from valutatrade_hub.infra.locks import file_lock
+
+
+class TokenBucket:
+    """
+    Token bucket, состояние которого хранится в файле под flock,
+    поэтому бюджет общий для всех процессов, опрашивающих источник.
+    """
+
+    def __init__(self, name: str, capacity: int, per_minute: float,
+                 state_dir: str, max_wait: float):
+        self.name = name
+        self.capacity = float(capacity)
+        self.rate = per_minute / 60.0  # токенов в секунду
+        self.max_wait = max_wait
+        os.makedirs(state_dir, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() else "_" for c in name.lower())
+        self.state_path = os.path.join(state_dir, f"{safe_name}.json")
+
+    @contextmanager
+    def _locked_state(self):
+        # file_lock блокирует и потоки этого процесса, и другие процессы
+        with file_lock(self.state_path + ".lock"):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                state = {}
+            yield state
+            with open(self.state_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+
+    def _take(self, tokens: float) -> float:
+        """Пытается списать токены; возвращает 0 или сколько ждать"""
+        with self._locked_state() as state:
+            now = time.time()
+            available = state.get("tokens", self.capacity)
+            updated = state.get("updated", now)
+            available = min(self.capacity,
+                            available + max(0.0, now - updated) * self.rate)
+            state["updated"] = now
+            if available >= tokens:
+                state["tokens"] = available - tokens
+                return 0.0
+            state["tokens"] = available
+            return (tokens - available) / self.rate
+
+    def acquire(self, tokens: float = 1.0, deadline: float = None):
+        """
+        Ждет токен не дольше max_wait (и не позже deadline по
+        time.monotonic()), иначе RateLimitExceededError
+        """
+        limit = time.monotonic() + self.max_wait
+        deadline = limit if deadline is None else min(limit, deadline)
+        while True:
+            wait = self._take(tokens)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceededError(self.name, wait)
+            time.sleep(wait)
@@ -0,0 +1,65 @@
+import logging
+import threading
+import time
+
+from valutatrade_hub.infra.settings import SettingsLoader
+
+logger = logging.getLogger("ValutaTrade")
+
+
+class BackgroundRefresher:
+    """
+    Single-flight фоновое обновление курсов (Singleton).
+    Одновременно выполняется не больше одного обновления, а повторный запуск
+    возможен не раньше RATES_REFRESH_COOLDOWN секунд после предыдущего.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(BackgroundRefresher, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._thread = None
+            cls._instance._last_started = None
+        return cls._instance
+
+    @property
+    def in_progress(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def trigger(self) -> bool:
+        """Запускает обновление, если оно не идет; True — если запущено"""
+        cooldown = SettingsLoader().get("RATES_REFRESH_COOLDOWN", 60)
+        with self._lock:
+            if self.in_progress:
+                return False
+            now = time.monotonic()
+            if (self._last_started is not None
+                    and now - self._last_started < cooldown):
+                return False
+            self._last_started = now
+            self._thread = threading.Thread(
+                target=self._run, name="rates-refresh", daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Ждет завершения идущего обновления (поток — daemon, и выход процесса
+        оборвал бы его). True — если обновление не идет или завершилось.
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return not self.in_progress
+
+    def _run(self):
+        try:
+            # Импорт здесь: updater тянет requests и клиентов API. Внутри try,
+            # чтобы ошибки импорта и остановки интерпретатора попадали в лог,
+            # а не в stderr как необработанное исключение потока
+            from .updater import RatesUpdater
+            logger.info("Background rates refresh started")
+            RatesUpdater().run_update()
+        except Exception as e:
+            logger.error(f"Background rates refresh failed: {e}")
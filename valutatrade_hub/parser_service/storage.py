@@ -1,13 +1,241 @@
+import bisect
 import json
+import mmap
 import os
+from array import array
+from datetime import datetime, timezone
 
+from valutatrade_hub.infra.locks import file_lock
 from valutatrade_hub.parser_service.config import ParserConfig
 
 
+class HistoryLog:
+    """
+    Append-only история курсов: по JSONL-сегменту на день (UTC),
+    exchange_rates-YYYY-MM-DD.jsonl. Пачка записей пишется одним fsync
+    на сегмент; чтение идет построчно, сегмент за сегментом.
+    """
+    PREFIX = "exchange_rates-"
+    SUFFIX = ".jsonl"
+
+    def __init__(self, history_dir: str, fsync: bool = True):
+        self.history_dir = history_dir
+        self.fsync = fsync
+
+    def _segment_path(self, day: str) -> str:
+        return os.path.join(self.history_dir, f"{self.PREFIX}{day}{self.SUFFIX}")
+
+    def append(self, items: list):
+        if not items:
+            return
+        os.makedirs(self.history_dir, exist_ok=True)
+
+        by_day = {}
+        for item in items:
+            day = item['timestamp'][:10]  # ISO: YYYY-MM-DD...
+            line = json.dumps(item, ensure_ascii=False)
+            by_day.setdefault(day, []).append(line)
+
+        for day, lines in by_day.items():
+            with open(self._segment_path(day), 'a', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+    def segments(self, start_day: str = None, end_day: str = None) -> list:
+        """Пути сегментов в хронологическом порядке"""
+        if not os.path.isdir(self.history_dir):
+            return []
+        days = sorted(
+            name[len(self.PREFIX):-len(self.SUFFIX)]
+            for name in os.listdir(self.history_dir)
+            if name.startswith(self.PREFIX) and name.endswith(self.SUFFIX))
+        return [self._segment_path(day) for day in days
+                if (not start_day or day >= start_day)
+                and (not end_day or day <= end_day)]
+
+    def iter_records(self, start: str = None, end: str = None, pair: str = None):
+        """Лениво отдает записи (ISO-границы start/end включительно)"""
+        for path in self.segments(start and start[:10], end and end[:10]):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        item = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # недописанная строка после сбоя
+                    if pair and (f"{item['from_currency']}_"
+                                 f"{item['to_currency']}") != pair:
+                        continue
+                    ts = item['timestamp']
+                    if (start and ts < start) or (end and ts > end):
+                        continue
+                    yield item
+
+
+class ColumnarHistoryStore:
+    """
+    Колоночная история по парам: <PAIR>.ts (int64, мс UTC) и <PAIR>.rate
+    (float64) — массивы фиксированной ширины, читаются через mmap.
+    Разреженный индекс (каждая SPARSE_STEP-я метка) сужает бинарный поиск,
+    а выборка по интервалу — срез memoryview без копирования.
+    """
+    TS_TYPE = 'q'
+    RATE_TYPE = 'd'
+    SPARSE_STEP = 1024
+
+    def __init__(self, columns_dir: str):
+        self.columns_dir = columns_dir
+        self._cache = {}  # pair -> (sizes, ts_view, rate_view, sparse)
+
+    @staticmethod
+    def to_ms(iso_ts: str) -> int:
+        dt = datetime.fromisoformat(iso_ts)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp() * 1000)
+
+    def _paths(self, pair: str):
+        base = os.path.join(self.columns_dir, pair.upper())
+        return base + ".ts", base + ".rate"
+
+    def pairs(self) -> list:
+        if not os.path.isdir(self.columns_dir):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.columns_dir)
+                      if name.endswith(".ts"))
+
+    def append(self, pair: str, ticks: list):
+        """
+        ticks: [(ts_ms, rate), ...]. Колонки только растут, поэтому тики
+        не новее последнего сохраненного отбрасываются. Чтение последней
+        метки и дозапись идут под блокировкой пары (<PAIR>.lock), чтобы
+        параллельные обновления не перемешали колонки.
+        """
+        os.makedirs(self.columns_dir, exist_ok=True)
+        ts_path, rate_path = self._paths(pair)
+        with file_lock(os.path.join(self.columns_dir, pair.upper() + ".lock")):
+            ts_view, _ = self.query(pair)
+            last = ts_view[-1] if len(ts_view) else None
+            ts_col, rate_col = array(self.TS_TYPE), array(self.RATE_TYPE)
+            for ts, rate in sorted(ticks):
+                if last is not None and ts <= last:
+                    continue
+                ts_col.append(ts)
+                rate_col.append(rate)
+                last = ts
+            if not ts_col:
+                return 0
+
+            # Сначала метки, затем курсы: при сбое между записями
+            # читатель берет min(длин) и лишний хвост меток игнорируется
+            with open(ts_path, 'ab') as f:
+                f.write(ts_col.tobytes())
+            with open(rate_path, 'ab') as f:
+                f.write(rate_col.tobytes())
+        return len(ts_col)
+
+    def merge(self, pair: str, ticks: list) -> int:
+        """
+        Вливает в колонки тики любого возраста (в отличие от append):
+        сохраненные и новые тики сортируются, дубликаты меток отбрасываются
+        (остается сохраненный), колонки переписываются целиком через
+        os.replace — уже открытые mmap продолжают читать старые файлы.
+        Возвращает число добавленных тиков.
+        """
+        os.makedirs(self.columns_dir, exist_ok=True)
+        ts_path, rate_path = self._paths(pair)
+        with file_lock(os.path.join(self.columns_dir, pair.upper() + ".lock")):
+            ts_view, rate_view = self.query(pair)
+            merged = dict(ticks)
+            merged.update(zip(ts_view, rate_view))
+            added = len(merged) - len(ts_view)
+            if not added:
+                return 0
+            ts_col, rate_col = array(self.TS_TYPE), array(self.RATE_TYPE)
+            for ts in sorted(merged):
+                ts_col.append(ts)
+                rate_col.append(merged[ts])
+            for path, column in ((ts_path, ts_col), (rate_path, rate_col)):
+                with open(path + ".tmp", 'wb') as f:
+                    f.write(column.tobytes())
+                os.replace(path + ".tmp", path)
+        return added
+
+    def append_records(self, items: list):
+        """Записи в формате истории -> колонки по парам"""
+        by_pair = {}
+        for item in items:
+            pair = f"{item['from_currency']}_{item['to_currency']}"
+            by_pair.setdefault(pair, []).append(
+                (self.to_ms(item['timestamp']), float(item['rate'])))
+        return sum(self.append(pair, ticks) for pair, ticks in by_pair.items())
+
+    @staticmethod
+    def _map(path: str, typecode: str):
+        size = os.path.getsize(path)
+        itemsize = array(typecode).itemsize
+        if size < itemsize:
+            return memoryview(b"").cast(typecode)
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Старые отображения освобождаются сборщиком, когда на них
+        # не остается срезов
+        return memoryview(mapped)[:size - size % itemsize].cast(typecode)
+
+    def _open(self, pair: str):
+        ts_path, rate_path = self._paths(pair)
+        if not os.path.exists(ts_path) or not os.path.exists(rate_path):
+            return None
+        sizes = (os.path.getsize(ts_path), os.path.getsize(rate_path))
+        cached = self._cache.get(pair)
+        if cached and cached[0] == sizes:
+            return cached
+
+        ts_view = self._map(ts_path, self.TS_TYPE)
+        rate_view = self._map(rate_path, self.RATE_TYPE)
+        count = min(len(ts_view), len(rate_view))
+        ts_view, rate_view = ts_view[:count], rate_view[:count]
+        sparse = [ts_view[i] for i in range(0, count, self.SPARSE_STEP)]
+        self._cache[pair] = (sizes, ts_view, rate_view, sparse)
+        return self._cache[pair]
+
+    def _search(self, ts_view, sparse, value: int, right: bool) -> int:
+        """Бинарный поиск: сначала по разреженному индексу, затем в блоке"""
+        step = self.SPARSE_STEP
+        if right:
+            block = bisect.bisect_right(sparse, value) - 1
+        else:
+            block = bisect.bisect_left(sparse, value) - 1
+        lo = max(block, 0) * step
+        hi = min(lo + 2 * step, len(ts_view))
+        find = bisect.bisect_right if right else bisect.bisect_left
+        return find(ts_view, value, lo, hi)
+
+    def query(self, pair: str, start_ms: int = None, end_ms: int = None):
+        """(метки, курсы) за [start_ms, end_ms] — срезы memoryview"""
+        opened = self._open(pair.upper())
+        if not opened:
+            empty_ts = memoryview(b"").cast(self.TS_TYPE)
+            return empty_ts, memoryview(b"").cast(self.RATE_TYPE)
+        _, ts_view, rate_view, sparse = opened
+        lo = 0 if start_ms is None else self._search(ts_view, sparse, start_ms,
+                                                     right=False)
+        hi = len(ts_view) if end_ms is None else self._search(ts_view, sparse,
+                                                             end_ms, right=True)
+        hi = max(lo, hi)
+        return ts_view[lo:hi], rate_view[lo:hi]
+
+
 class RatesStorage:
     def __init__(self, config: ParserConfig):
         self.rates_path = config.RATES_FILE_PATH
         self.history_path = config.HISTORY_FILE_PATH
+        self.validated_path = config.VALIDATED_FILE_PATH
+        self.history = HistoryLog(config.HISTORY_DIR, config.HISTORY_FSYNC)
+        self.columns = ColumnarHistoryStore(config.HISTORY_COLUMNS_DIR)
 
     def _atomic_write(self, filepath, data):
         """Атомарная запись через временный файл"""
@@ -20,34 +248,50 @@ class RatesStorage:
             json.dump(data, f, indent=2, ensure_ascii=False)
         os.replace(temp_file, filepath)
 
+    @staticmethod
+    def _history_item(record: dict) -> dict:
+        """Запись истории в формате exchange_rates.json"""
+        return {
+            # ID для истории (чтобы не дублировать)
+            "id": f"{record['pair']}_{record['timestamp']}",
+            "from_currency": record['from_currency'],
+            "to_currency": record['to_currency'],
+            "rate": record['rate'],
+            "timestamp": record['timestamp'],
+            "source": record['source'],
+            "meta": record.get("meta", {})
+        }
+
     def save_history(self, new_records: list):
-        """Добавляет записи в exchange_rates.json (Append-only)"""
+        """Дописывает записи в дневные JSONL-сегменты истории"""
+        items = [self._history_item(r) for r in new_records]
+        self.history.append(items)
+        self.columns.append_records(items)
+
+    def convert_legacy_history(self) -> int:
+        """Переносит массив exchange_rates.json в JSONL-сегменты"""
         if not os.path.exists(self.history_path):
-            history = []
-        else:
-            try:
-                with open(self.history_path, 'r', encoding='utf-8') as f:
-                    history = json.load(f)
-            except json.JSONDecodeError:
-                history = []
-
-        # Формируем ID для истории (чтобы не дублировать)
-        for record in new_records:
-            rec_id = f"{record['pair']}_{record['timestamp']}"
-
-            # Подготовка записи для истории
-            history_item = {
-                "id": rec_id,
-                "from_currency": record['from_currency'],
-                "to_currency": record['to_currency'],
-                "rate": record['rate'],
-                "timestamp": record['timestamp'],
-                "source": record['source'],
-                "meta": record.get("meta", {})
-            }
-            history.append(history_item)
+            return 0
+        with open(self.history_path, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+        self.history.append(legacy)
+        os.replace(self.history_path, self.history_path + ".migrated")
+        self.rebuild_columns()
+        return len(legacy)
 
-        self._atomic_write(self.history_path, history)
+    def rebuild_columns(self) -> int:
+        """
+        Достраивает колоночное хранилище по JSONL-сегментам. Тики вливаются
+        слиянием, а не дозаписью: перенесенная старая история старше того,
+        что обновления курсов уже успели записать в колонки.
+        """
+        by_pair = {}
+        for item in self.history.iter_records():
+            pair = f"{item['from_currency']}_{item['to_currency']}"
+            by_pair.setdefault(pair, []).append(
+                (self.columns.to_ms(item['timestamp']), float(item['rate'])))
+        return sum(self.columns.merge(pair, ticks)
+                   for pair, ticks in by_pair.items())
 
     def save_snapshot(self, records: list):
         """Обновляет rates.json (Кэш для Core Service)"""
@@ -73,3 +317,15 @@ class RatesStorage:
             current_data["last_refresh"] = records[0]['timestamp']
 
         self._atomic_write(self.rates_path, current_data)
+
+    def mark_validated(self, source: str, timestamp: str):
+        """Источник ответил 304: курсы актуальны на timestamp"""
+        validated = {}
+        if os.path.exists(self.validated_path):
+            try:
+                with open(self.validated_path, 'r', encoding='utf-8') as f:
+                    validated = json.load(f)
+            except json.JSONDecodeError:
+                pass
+        validated[source] = timestamp
+        self._atomic_write(self.validated_path, validated)
@@ -1,4 +1,7 @@
 import logging
+import queue
+import threading
+import time
 
 from valutatrade_hub.core.exceptions import ApiRequestError
 
@@ -18,10 +21,8 @@ class RatesUpdater:
             ExchangeRateApiClient(self.config)
         ]
 
-    def run_update(self, source_filter=None):
-        logger.info("Starting rates update...")
-        all_rates = []
-
+    def _select_clients(self, source_filter=None):
+        selected = []
         for client in self.clients:
             client_name = client.__class__.__name__
 
@@ -33,23 +34,79 @@ class RatesUpdater:
                 if ("exchange" in source_filter.lower() and
                         "Exchange" not in client_name):
                     continue
+            selected.append(client)
+        return selected
+
+    def _commit(self, client_name, rates):
+        """Сохраняет результат одного источника сразу по готовности"""
+        logger.info(f"Success {client_name}: obtained {len(rates)} rates.")
+        changed = [r for r in rates if not r["meta"].get("not_modified")]
+        if changed:
+            self.storage.save_history(changed)
+            self.storage.save_snapshot(changed)
+        elif rates:
+            # 304: курсы не изменились — rates.json и историю не трогаем
+            logger.info(f"{client_name}: not modified, storage untouched.")
+            self.storage.mark_validated(rates[0]["source"], rates[0]["timestamp"])
+
+    @staticmethod
+    def _fetch(client, deadline, results):
+        client_name = client.__class__.__name__
+        try:
+            results.put((client_name, client.fetch_rates(deadline=deadline), None))
+        except Exception as e:
+            results.put((client_name, None, e))
+
+    def run_update(self, source_filter=None):
+        logger.info("Starting rates update...")
+        clients = self._select_clients(source_filter)
+        if not clients:
+            logger.warning("No rates obtained from any source.")
+            return 0
+
+        total = 0
+        started = time.monotonic()
+        # Источник сам прекращает повторы к своему дедлайну, а весь цикл
+        # (вместе с сохранением результатов) ждем не дольше UPDATE_DEADLINE
+        source_deadline = started + self.config.SOURCE_DEADLINE
+        overall_deadline = started + self.config.UPDATE_DEADLINE
+
+        results = queue.Queue()
+        pending = set()
+        for client in clients:
+            client_name = client.__class__.__name__
+            logger.info(f"Fetching from {client_name}...")
+            pending.add(client_name)
+            # Daemon: зависший запрос не держит процесс после выхода
+            threading.Thread(target=self._fetch,
+                             args=(client, source_deadline, results),
+                             name=f"rates-fetch-{client_name}",
+                             daemon=True).start()
 
+        while pending:
+            remaining = overall_deadline - time.monotonic()
+            if remaining <= 0:
+                break
             try:
-                logger.info(f"Fetching from {client_name}...")
-                rates = client.fetch_rates()
-                all_rates.extend(rates)
-                logger.info(f"Success {client_name}: obtained {len(rates)} rates.")
-            except ApiRequestError as e:
-                logger.error(f"Failed to fetch from {client_name}: {e}")
-            except Exception as e:
-                logger.error(f"Unexpected error in {client_name}: {e}")
-
-        if all_rates:
-            logger.info(f"Writing {len(all_rates)} rates to storage...")
-            self.storage.save_history(all_rates)
-            self.storage.save_snapshot(all_rates)
-            logger.info("Update completed.")
-            return len(all_rates)
+                client_name, rates, error = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.discard(client_name)
+            if isinstance(error, ApiRequestError):
+                logger.error(f"Failed to fetch from {client_name}: {error}")
+                continue
+            if error:
+                logger.error(f"Unexpected error in {client_name}: {error}")
+                continue
+            self._commit(client_name, rates)
+            total += len(rates)
+
+        for client_name in pending:
+            logger.error(f"Failed to fetch from {client_name}: deadline exceeded")
+
+        duration = time.monotonic() - started
+        if total:
+            logger.info(f"Update completed: {total} rates in {duration:.2f}s.")
         else:
             logger.warning("No rates obtained from any source.")
-            return 0
+        return total
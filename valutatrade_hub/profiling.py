@@ -0,0 +1,156 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from valutatrade_hub.infra.settings import SettingsLoader
+
+
+class _StackSampler:
+    """
+    Один поток на процесс снимает стеки всех профилируемых команд: под
+    serve команды идут параллельно, и поток на каждую множил бы вызовы
+    sys._current_frames(). Блокировка — только вокруг списка команд и
+    записи сэмплов, сами команды друг друга не ждут.
+    """
+    _lock = threading.Lock()
+    _targets = {}  # id потока команды -> CommandProfiler
+    _thread = None
+
+    @classmethod
+    def add(cls, thread_id: int, profiler: "CommandProfiler"):
+        with cls._lock:
+            cls._targets[thread_id] = profiler
+            if cls._thread is None:
+                cls._thread = threading.Thread(
+                    target=cls._loop, name="valutatrade-profiler", daemon=True)
+                cls._thread.start()
+
+    @classmethod
+    def remove(cls, thread_id: int):
+        """После возврата сэмплы в профиль команды больше не пишутся"""
+        with cls._lock:
+            cls._targets.pop(thread_id, None)
+
+    @classmethod
+    def _loop(cls):
+        interval = None
+        while True:
+            if interval:
+                time.sleep(interval)
+            with cls._lock:
+                if not cls._targets:
+                    cls._thread = None  # следующая команда запустит заново
+                    return
+                if interval:
+                    frames = sys._current_frames()
+                    for thread_id, profiler in cls._targets.items():
+                        profiler._record(frames.get(thread_id))
+                interval = min(p.interval for p in cls._targets.values())
+
+
+class CommandProfiler:
+    """
+    Профиль одной команды: cProfile (точные вызовы, файл .pstats) и стек
+    команды каждые PROFILE_SAMPLE_INTERVAL секунд (файл .collapsed для
+    flamegraph.pl / speedscope). Файлы — в LOGS_DIR/profiles.
+
+    cProfile у каждой команды свой и до Python 3.11 включительно следит
+    только за своим потоком, поэтому параллельные команды под serve не
+    сериализуются. С 3.12 cProfile допускает один активный профилировщик на
+    процесс: если он занят другой командой, эта получает только сэмплы стека.
+    """
+
+    def __init__(self, label: str, top: int = None, interval: float = None):
+        settings = SettingsLoader()
+        self.label = re.sub(r"[^\w-]", "_", label)
+        self.top = top or settings.get("PROFILE_TOP")
+        self.interval = interval or settings.get("PROFILE_SAMPLE_INTERVAL")
+        self.folder = os.path.join(settings.get("LOGS_DIR"), "profiles")
+        self.stacks = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self.paths = ()
+        self._profile = None
+
+    def run(self, func, *args, **kwargs):
+        """Вызывает func под профилировщиком; профиль сохраняется и при ошибке"""
+        import cProfile
+
+        thread_id = threading.get_ident()
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError:
+            self._profile = None  # 3.12+: cProfile занят другой командой
+        _StackSampler.add(thread_id, self)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if self._profile:
+                self._profile.disable()
+            self.elapsed = time.perf_counter() - started
+            _StackSampler.remove(thread_id)
+            self.paths = self._save()
+
+    def _record(self, frame):
+        """Сэмпл стека команды (вызывает _StackSampler под своей блокировкой)"""
+        root = CommandProfiler.run.__code__  # кадры выше команды не нужны
+        stack = []
+        while frame is not None and frame.f_code is not root:
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name)  # 3.11+
+            stack.append(f"{os.path.basename(code.co_filename)}:{name}")
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def _save(self):
+        os.makedirs(self.folder, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        base = os.path.join(self.folder, f"{stamp}-{self.label}")
+        pstats_path = None
+        if self._profile:
+            pstats_path = base + ".pstats"
+            self._profile.dump_stats(pstats_path)
+        with open(base + ".collapsed", 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return pstats_path, base + ".collapsed"
+
+    def top_functions(self):
+        """(вызовы, собственное время, накопленное время, функция) по убыванию
+        собственного времени"""
+        import pstats
+
+        rows = []
+        if self._profile is None:
+            return rows
+        stats = pstats.Stats(self._profile).stats
+        for (filename, line, name), (_, calls, own, cumulative, _) in stats.items():
+            if "_lsprof.Profiler" in name:  # disable() самого профилировщика
+                continue
+            if filename == "~":  # встроенные функции: {method 'write' ...}
+                where = name
+            else:
+                where = f"{name} ({os.path.basename(filename)}:{line})"
+            rows.append((calls, own, cumulative, where))
+        rows.sort(key=lambda r: r[1], reverse=True)
+        return rows[:self.top]
+
+    def report(self) -> str:
+        lines = [f"Профиль '{self.label}': {self.elapsed * 1000:.1f} мс, "
+                 f"сэмплов стека: {self.samples}",
+                 f"{'calls':>8} {'own ms':>9} {'cum ms':>9}  function"]
+        for calls, own, cumulative, where in self.top_functions():
+            lines.append(f"{calls:>8} {own * 1000:>9.3f} "
+                         f"{cumulative * 1000:>9.3f}  {where}")
+        pstats_path, collapsed_path = self.paths
+        lines.append(f"pstats: {pstats_path or 'нет (cProfile занят другой командой)'}")
+        lines.append(f"flamegraph (collapsed stacks): {collapsed_path}")
+        return "\n".join(lines)